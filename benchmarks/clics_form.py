@@ -0,0 +1,51 @@
+"""
+Micro-benchmark comparing implementations of the CLICS form computation.
+
+Usage:
+    python benchmarks/clics_form.py [NUMBER_OF_WORDS]
+"""
+import sys
+import random
+import timeit
+
+from unidecode import unidecode
+
+from pyclics.plugin import ClicsForm, ALLOWED_CHARACTERS
+
+
+def clics_form(word):
+    """The previous implementation."""
+    if word:
+        return ''.join(c for c in unidecode(word) if c in ALLOWED_CHARACTERS).lower()
+
+
+def words(n, distinct=0.1, seed=42):
+    """
+    A list of n words, with a share of `distinct` distinct words - simulating the heavy
+    repetition of forms across datasets.
+    """
+    rnd = random.Random(seed)
+    alphabet = 'abcdefghijklmnoprstuwxyzəɛɔŋʃʒʔáéíóúàèìòùâêîôûãõñçː̃ʰʲʷ-.'
+    vocabulary = [
+        ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(2, 10)))
+        for _ in range(max(int(n * distinct), 1))]
+    return [rnd.choice(vocabulary) for _ in range(n)]
+
+
+def main(n):
+    column = words(n)
+    fast, uncached = ClicsForm(), ClicsForm(maxsize=0)
+    assert [clics_form(w) for w in column] == [fast(w) for w in column] == fast.batch(column)
+
+    for name, stmt in [
+        ('unidecode per word', lambda: [clics_form(w) for w in column]),
+        ('translation table only', lambda: [uncached(w) for w in column]),
+        ('ClicsForm', lambda: [fast(w) for w in column]),
+        ('ClicsForm.batch', lambda: fast.batch(column)),
+    ]:
+        seconds = min(timeit.repeat(stmt, number=1, repeat=3))
+        print('{0:<25} {1:8.3f}s {2:12.0f} words/s'.format(name, seconds, n / seconds))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
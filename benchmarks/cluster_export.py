@@ -0,0 +1,96 @@
+"""
+Benchmark comparing implementations of the export of clusters for the app in `clics cluster`.
+
+Usage:
+    python benchmarks/cluster_export.py [NUMBER_OF_NODES]
+"""
+import sys
+import time
+import random
+import pathlib
+import tempfile
+import collections
+
+import networkx as nx
+from networkx.readwrite import json_graph
+from clldutils import jsonlib
+
+from pyclics.commands.cluster import export_clusters
+
+
+def export_clusters_quadratic(graph, clusters, algo, neighbor_weight, cluster_dir):
+    """The previous implementation, looping over all nodes for each node."""
+    cluster_names = {}
+    removed = []
+    for idx, nodes in sorted(clusters.items()):
+        sg = graph.subgraph(nodes)
+        for node, data in sg.nodes(data=True):
+            data['OutEdge'] = []
+            neighbors = [
+                n for n in graph if
+                n in graph[node] and
+                graph[node][n]['FamilyWeight'] >= neighbor_weight and
+                n not in sg]
+            if neighbors:
+                sg.nodes[node]['OutEdge'] = []
+                for n in neighbors:
+                    sg.nodes[node]['OutEdge'].append([
+                        graph.nodes[n]['ClusterName'],
+                        graph.nodes[n]['CentralConcept'],
+                        graph.nodes[n]['Gloss'],
+                        graph[node][n]['WordWeight'],
+                        n
+                    ])
+        if len(sg) > 1:
+            fn = cluster_dir / (graph.nodes[nodes[0]]['ClusterName'] + '.json')
+            jsonlib.dump(json_graph.adjacency_data(sg), fn, sort_keys=True)
+            for node in nodes:
+                cluster_names[graph.nodes[node]['Gloss']] = fn.stem
+        else:
+            removed += [list(nodes)[0]]
+    return cluster_names, removed
+
+
+def synthetic_graph(n, degree=8, cluster_size=10, seed=42):
+    """
+    A random graph with n nodes, annotated like the colexification graph after clustering.
+    """
+    rnd = random.Random(seed)
+    graph = nx.Graph()
+    clusters = collections.defaultdict(list)
+    for i in range(n):
+        node = str(i + 1)
+        idx = rnd.randint(1, max(n // cluster_size, 1))
+        clusters[idx].append(node)
+        graph.add_node(
+            node,
+            Gloss='GLOSS{0}'.format(i),
+            infomap=str(idx),
+            ClusterName='infomap_{0}'.format(idx),
+            CentralConcept='GLOSS{0}'.format(idx))
+    for _ in range(n * degree // 2):
+        a, b = rnd.sample(range(1, n + 1), 2)
+        graph.add_edge(
+            str(a), str(b), FamilyWeight=rnd.randint(1, 10), WordWeight=rnd.randint(1, 20))
+    return graph, clusters
+
+
+def main(n):
+    results = []
+    for name, func in [
+        ('quadratic', export_clusters_quadratic),
+        ('adjacency', export_clusters),
+    ]:
+        graph, clusters = synthetic_graph(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.time()
+            res = func(graph, clusters, 'infomap', 5, pathlib.Path(tmp))
+            seconds = time.time() - start
+            files = {p.name: p.read_text(encoding='utf8') for p in pathlib.Path(tmp).iterdir()}
+        results.append((res, files))
+        print('{0:<10} {1:8.3f}s'.format(name, seconds))
+    assert results[0] == results[1]
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
@@ -36,6 +36,7 @@ setup(
         'zope.component',
         'zope.interface',
         'pybtex',
+        'scipy',
     ],
     extras_require={
         'dev': [
@@ -1,6 +1,8 @@
 import json
+import pickle
 import itertools
 import collections
+import multiprocessing
 import pkg_resources
 
 from clldutils.apilib import API
@@ -10,14 +12,21 @@ from csvw.dsv import UnicodeWriter
 from zope.component import getGlobalSiteManager, getUtility
 from tqdm import tqdm
 
-from pyclics.db import Database
+from pyclics.db import Database, merge_concept_data
+from pyclics.edges import EdgeAccumulator
+from pyclics.sidecar import NODE_ATTRS, EDGE_ATTRS
 from pyclics.models import Network
 from pyclics import interfaces
 from pyclics import plugin
-from pyclics.util import iter_subgraphs
+from pyclics.util import iter_subgraphs, implementation_name
 
 __all__ = ['Clics']
 
+# Process-wide LRU cache of loaded graphs, mapping (graph directory, network, threshold, edgefilter)
+# to pairs (file stamp, graph):
+GRAPH_CACHE = collections.OrderedDict()
+GRAPH_CACHE_SIZE = 4
+
 
 def register_clusterer(registry, obj, name=None):
     registry.registerUtility(obj, interfaces.IClusterer, name or obj.__name__)
@@ -116,23 +125,238 @@ class Clics(API):
         p.write_text('var CLUSTERS = ' + json.dumps(v, indent=2) + ';', encoding='utf-8')
         self.file_written(p)
 
-    def save_graph(self, graph, network, threshold, edgefilter):
-        network = Network(network, threshold, edgefilter, self.graph_dir)
-        return self.file_written(network.save(graph))
-
-    def load_graph(self, network, threshold, edgefilter):
-        return Network(network, threshold, edgefilter, self.graph_dir).graph
+    def save_graph(
+            self, graph, network, threshold, edgefilter, formats=('gml', 'bin'), sidecar=False):
+        """
+        :param formats: Formats in which to save the graph - GML for export, binary for fast \
+        loading.
+        :param sidecar: If `True`, bulky attributes of nodes and edges are stored in a sidecar \
+        `AttributeStore` rather than in the network files. Pass an `AttributeStore` to store the \
+        bulky attributes for the nodes and edges of `graph` from this store.
+        :return: Path of the file written in the first format.
+        """
+        GRAPH_CACHE.pop((str(self.graph_dir), network, threshold, edgefilter), None)
+        store = Network(network, threshold, edgefilter, self.graph_dir).sidecar
+        if sidecar:
+            self.file_written(
+                store.write(graph, source=None if sidecar is True else sidecar))
+        elif store.exists():
+            store.path.unlink()
+        exclude = NODE_ATTRS + EDGE_ATTRS if sidecar else ()
+        res = [
+            self.file_written(
+                Network(network, threshold, edgefilter, self.graph_dir, format=fmt).save(
+                    graph, exclude=exclude))
+            for fmt in formats]
+        return res[0]
+
+    def graph_attributes(self, network, threshold, edgefilter):
+        """
+        :return: The sidecar `AttributeStore` of the network or `None`.
+        """
+        store = Network(network, threshold, edgefilter, self.graph_dir).sidecar
+        return store if store.exists() else None
+
+    def load_graph(self, network, threshold, edgefilter, snapshot=True):
+        """
+        Load a graph from the fastest available file, i.e. from the binary format, unless a \
+        (possibly compressed) GML file has been written later.
+
+        Loaded graphs are cached in memory, keyed by file modification time and size. Since
+        callers may modify the graph, a copy of the cached graph is returned.
+
+        :param snapshot: If `True`, a binary snapshot is written when the graph had to be read \
+        from GML, to speed up loading in other processes.
+        """
+        binary, gml, gz = [
+            Network(network, threshold, edgefilter, self.graph_dir, format=fmt)
+            for fmt in ['bin', 'gml', 'gml.gz']]
+        # The most recently written file - preferring faster formats for equal mtimes:
+        existing = [n for n in [binary, gml, gz] if n.fname.exists()]
+        if not existing:
+            return gml.graph
+        source = max(existing, key=lambda n: n.fname.stat().st_mtime)
+
+        key = (str(self.graph_dir), network, threshold, edgefilter)
+        stat = source.fname.stat()
+        stamp = (source.format, stat.st_mtime_ns, stat.st_size)
+        if key in GRAPH_CACHE and GRAPH_CACHE[key][0] == stamp:
+            GRAPH_CACHE.move_to_end(key)
+            return GRAPH_CACHE[key][1].copy()
+
+        graph = source.graph
+        if snapshot and source is not binary:
+            try:
+                binary.save(graph)
+                stat = binary.fname.stat()
+                stamp = (binary.format, stat.st_mtime_ns, stat.st_size)
+            except (OSError, ValueError):  # pragma: no cover
+                pass
+        GRAPH_CACHE[key] = (stamp, graph)
+        GRAPH_CACHE.move_to_end(key)
+        while len(GRAPH_CACHE) > GRAPH_CACHE_SIZE:
+            GRAPH_CACHE.popitem(last=False)
+        return graph.copy()
 
     def iter_subgraphs(self, network, threshold, edgefilter):
         return iter_subgraphs(self.load_graph(network, threshold, edgefilter))
 
-    def iter_colexifications(self, varieties=None):
+    @property
+    def colexification_config(self):
+        """
+        :return: `str` identifying the implementations used to compute colexifications.
+        """
+        return ' '.join(implementation_name(obj) for obj in [self.colexifier, self.clicsform])
+
+    def materialize_colexifications(self, workers=1):
+        """
+        Compute colexifications for all datasets for which no colexifications computed with the \
+        current configuration are stored in the db yet.
+
+        :param workers: Number of processes computing colexifications - see `iter_colexifications`.
+        :return: `list` of IDs of the datasets for which colexifications have been computed.
+        """
+        config, configs = self.colexification_config, self.db.colexification_configs
+        stale = [dsid for dsid in self.db.datasets if configs.get(dsid) != config]
+        varieties = collections.defaultdict(list)
+        for v in self.db.varieties:
+            varieties[v.source].append(v)
+        for dsid in stale:
+            # Since we cannot write to the db while reading wordlists from it, we compute the
+            # colexifications per dataset and write them when done.
+            self.db.write_colexifications(
+                config,
+                [dsid],
+                list(self.iter_colexifications(varieties[dsid], workers=workers))
+                if varieties[dsid] else [])
+        return stale
+
+    def incremental_colexifications(self, materialized=False, workers=1):
+        """
+        Compute colexifications and concept data from per-dataset partial results.
+
+        Partial results are persisted in `graphs/partials` and re-computed only for datasets which
+        have changed since - including the data added from the catalogs - or have been computed
+        with a different colexification configuration.
+        Partial results of datasets which are no longer in the db are removed.
+
+        Note: While only partial results of changed datasets are re-computed, the partial results
+        of all datasets are read and merged on each call.
+
+        :return: Pair (`EdgeAccumulator`, concept data as returned by `merge_concept_data`).
+        """
+        d = self.existing_dir('graphs', 'partials')
+        config, fingerprints, datasets = \
+            self.colexification_config, self.db.fingerprints, self.db.datasets
+        catalogs = self.db.catalog_digests
+        for p in d.glob('*.pickle'):
+            if p.stem not in datasets:
+                p.unlink()
+
+        varieties = collections.defaultdict(list)
+        for v in self.db.varieties:
+            varieties[v.source].append(v)
+
+        edges, concepts = EdgeAccumulator(), []
+        # Partial results must be merged in the order of `Database.iter_wordlists`:
+        for dsid in sorted(datasets):
+            p = d / '{0}.pickle'.format(dsid)
+            partial = pickle.loads(p.read_bytes()) if p.exists() else {}
+            key = (fingerprints.get(dsid), config, catalogs.get(dsid))
+            stamp = tuple(partial.get(k) for k in ['fingerprint', 'config', 'catalogs'])
+            if (not key[0]) or stamp != key:
+                if self._log:
+                    self._log.info('computing colexifications for {0}'.format(dsid))
+                partial = dict(
+                    fingerprint=fingerprints.get(dsid),
+                    config=config,
+                    catalogs=catalogs.get(dsid),
+                    edges=EdgeAccumulator().update(self.iter_colexifications(
+                        varieties[dsid], materialized=materialized, workers=workers)
+                        if varieties[dsid] else []),
+                    concepts=self.db.concept_data(dsid))
+                p.write_bytes(pickle.dumps(partial, protocol=pickle.HIGHEST_PROTOCOL))
+            edges.merge(partial['edges'])
+            concepts.append(partial['concepts'])
+        return edges, merge_concept_data(concepts)
+
+    def iter_colexifications(self, varieties=None, materialized=False, workers=1):
+        """
+        :param materialized: If `True`, colexifications are read from the db - after being \
+        computed for datasets for which they are missing.
+        :param workers: Number of processes computing colexifications. Varieties are split into \
+        contiguous chunks, and the colexifications computed for each chunk are yielded in order, \
+        thus the result does not depend on the number of workers. Workers are forked processes; \
+        on platforms not supporting `fork`, colexifications are computed sequentially.
+        :return: Generator of (variety, formA, formB) triples.
+        """
         varieties = varieties or self.db.varieties
+        if materialized:
+            self.materialize_colexifications(workers=workers)
+            for res in self.db.iter_colexifications(varieties):
+                yield res
+            return
+
+        if workers > 1 and len(varieties) > 1 \
+                and 'fork' in multiprocessing.get_all_start_methods():
+            for res in self._iter_colexifications_parallel(varieties, workers):
+                yield res
+            return
+
         for v_, forms in tqdm(self.db.iter_wordlists(varieties), total=len(varieties), leave=False):
             for gen in self._iter_colexifications(forms):
                 for formA, formB in gen:
                     yield v_, formA, formB
 
+    def _iter_colexifications_parallel(self, varieties, workers):
+        # Varieties are sorted the way `Database.iter_wordlists` streams them, so that the
+        # concatenated chunks are in the same order as the sequential computation.
+        varieties = sorted(varieties, key=lambda v: (v.source, v.id))
+        size = max(1, len(varieties) // (4 * workers))
+        chunks = [varieties[i:i + size] for i in range(0, len(varieties), size)]
+        # Forked workers re-use this instance - with the same plugins registered. Other start
+        # methods would re-create the API in the workers, thus we always fork.
+        global _api
+        _api = self
+        try:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                # We only compute a limited number of chunks ahead, to limit memory consumption.
+                pending, chunks_ = collections.deque(), iter(chunks)
+                for chunk in itertools.islice(chunks_, 2 * workers):
+                    pending.append((len(chunk), pool.apply_async(_colexifications, (chunk,))))
+                with tqdm(total=len(varieties), leave=False) as pbar:
+                    while pending:
+                        n, result = pending.popleft()
+                        res = result.get()
+                        chunk = next(chunks_, None)
+                        if chunk:
+                            pending.append(
+                                (len(chunk), pool.apply_async(_colexifications, (chunk,))))
+                        for triple in res:
+                            yield triple
+                        pbar.update(n)
+        finally:
+            _api = None
+
     def _iter_colexifications(self, forms):  # only included for better testability!
         for colexified in self.colexifier(forms):
             yield itertools.combinations(colexified, r=2)
+
+
+# The API instance used by the forked processes computing colexifications:
+_api = None
+
+
+def _colexifications(varieties):
+    """
+    Compute the colexifications for a chunk of varieties in a worker process.
+
+    :return: `list` of (variety, formA, formB) triples.
+    """
+    # Scanning the form table of a single dataset is fast, otherwise we query per variety.
+    streaming = len(set(v.source for v in varieties)) == 1
+    return [
+        (v, formA, formB)
+        for v, forms in _api.db.iter_wordlists(varieties, streaming=streaming)
+        for gen in _api._iter_colexifications(forms)
+        for formA, formB in gen]
@@ -2,12 +2,23 @@
 Module provides methods for the detection and handling of colexifications in wordlists.
 """
 
+import json
+import math
+import random
+import sqlite3
+import pathlib
+import contextlib
+import collections
+import multiprocessing
+
 import networkx as nx
 from lingpy.align.pairwise import Pairwise
+from lingpy.sequence.sound_classes import ipa2tokens, tokens2class
 from collections import defaultdict
 from lingpy.algorithm import extra
 from lingpy.algorithm import clustering as cluster
 from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
 
@@ -109,83 +120,432 @@ def get_colexifications(
 
 
 
+def _tokens(word, split=True):
+    """
+    Segment a word the way `Pairwise` does, i.e. tokenizing strings without spaces, unless
+    `split` is set.
+    """
+    return tuple(word.split() if split or " " in word else ipa2tokens(word))
+
+
+def _align(task):
+    pairs, settings = task
+    pair = Pairwise([(list(a), list(b)) for a, b in pairs])
+    pair.align(**settings)
+    return [alignment[2] for alignment in pair.alignments]
+
+
+def _cognate_count(task):
+    threshold, matrix, taxa, cluster_method = task
+    if cluster_method == "infomap":
+        cluster_function = extra.infomap_clustering
+    else:
+        cluster_function = cluster.flat_upgma
+    return len(cluster_function(threshold, matrix, taxa=taxa))
+
+
+def _map(func, tasks, workers):
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    return [func(task) for task in tasks]
+
+
+class AlignmentCache(object):
+    """
+    Alignment distances of pairs of segmented words, optionally persisted in a SQLite db.
+
+    Distances are keyed by the alignment settings and the ordered pair of token sequences -
+    since alignment distances are not always symmetric.
+    """
+    def __init__(self, path=None, **settings):
+        """
+        @param path: Path of the SQLite db to read cached distances from and write them to.
+        @param settings: Keyword arguments for `Pairwise.align`.
+        """
+        self.settings = dict(settings, distance=True)
+        self.key = json.dumps(self.settings, sort_keys=True)
+        self.path = pathlib.Path(str(path)) if path else None
+        self._distances, self._new = {}, {}
+        if self.path and self.path.exists():
+            with contextlib.closing(sqlite3.connect(self.path.as_posix())) as conn:
+                for a, b, distance in conn.execute(
+                        "SELECT a, b, distance FROM distance WHERE settings = ?", (self.key,)):
+                    self._distances[tuple(a.split()), tuple(b.split())] = distance
+
+    def __len__(self):
+        return len(self._distances)
+
+    def __contains__(self, pair):
+        return pair in self._distances
+
+    def __getitem__(self, pair):
+        return self._distances[pair]
+
+    def update(self, pairs, workers=1, batch_size=1000):
+        """
+        Compute the distances for pairs of token sequences which are not yet cached.
+
+        @param workers: The number of processes aligning batches of pairs in parallel.
+        """
+        missing = list(collections.OrderedDict.fromkeys(
+            pair for pair in pairs if pair not in self._distances))
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        for batch, distances in zip(
+                batches, _map(_align, [(batch, self.settings) for batch in batches], workers)):
+            for pair, distance in zip(batch, distances):
+                self._distances[pair] = self._new[pair] = distance
+        return self
+
+    def save(self):
+        """
+        Write newly computed distances to the SQLite db.
+        """
+        if self.path and self._new:
+            with contextlib.closing(sqlite3.connect(self.path.as_posix())) as conn:
+                conn.execute("""\
+CREATE TABLE IF NOT EXISTS distance (
+    settings TEXT, a TEXT, b TEXT, distance REAL, PRIMARY KEY (settings, a, b)
+) WITHOUT ROWID""")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO distance VALUES (?, ?, ?, ?)",
+                    ((self.key, ' '.join(a), ' '.join(b), d) for (a, b), d in self._new.items()))
+                conn.commit()
+            self._new = {}
+        return self.path
+
+
+def bounded_edit_distance(seqA, seqB, bound):
+    """
+    Compute the edit distance of two sequences, stopping as soon as it reaches `bound`.
+
+    @returns: The edit distance, or `bound` if the distance is at least `bound`.
+    """
+    if abs(len(seqA) - len(seqB)) >= bound:
+        return bound
+    previous = list(range(len(seqB) + 1))
+    for i, a in enumerate(seqA, start=1):
+        current = [i]
+        for j, b in enumerate(seqB, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        if min(current) >= bound:
+            return bound
+        previous = current
+    return min(previous[-1], bound)
+
+
+class PreFilter(object):
+    """
+    Decides clear cases of word pairs without alignment, comparing their sound-class strings.
+
+    Pairs with identical sound classes are assigned distance 0, pairs with a normalized edit
+    distance of at least `bound` distance 1 - i.e. no similarity. Other pairs are left to
+    the alignment.
+    """
+    def __init__(self, bound=0.8, model="sca"):
+        self.bound = bound
+        self.model = model
+        self._classes = {}
+
+    def classes(self, tokens):
+        if tokens not in self._classes:
+            self._classes[tokens] = tokens2class(list(tokens), self.model)
+        return self._classes[tokens]
+
+    def __call__(self, pair):
+        """
+        @returns: The distance of the pair, or None, if it must be computed by alignment.
+        """
+        classesA, classesB = self.classes(pair[0]), self.classes(pair[1])
+        if classesA == classesB:
+            return 0
+        size = max(len(classesA), len(classesB))
+        bound = math.ceil(self.bound * size)
+        if bounded_edit_distance(classesA, classesB, bound) >= bound:
+            return 1
+        return None
+
+
 def weight_by_cognacy(
         graph, 
         threshold=0.45,
         cluster_method="infomap",
-        label="cognate_count"
+        label="cognate_count",
+        cache=None,
+        workers=1,
+        prefilter=None,
+        sample=100,
         ):
     """
     Function weights the data by computing cognate sets.
 
+    Alignment distances are looked up in an `AlignmentCache`, so re-running with a different
+    `threshold` or `cluster_method` does not require re-aligning any words.
+
+    @param cache: An `AlignmentCache` - if None, a new in-memory cache is used.
+    @param workers: The number of processes aligning words and clustering them in parallel.
+    @param prefilter: A `PreFilter`, deciding clear cases without alignment.
+    @param sample: The number of pairs decided by the pre-filter which are aligned nonetheless,
+        to report disagreements.
+    @returns: If a pre-filter is used, a report as dict, listing the number of distinct word
+        pairs, the fraction of pairs decided by the pre-filter, and for the sample, the number
+        of pairs for which pre-filter and alignment disagree on whether the distance is below
+        the threshold, and the mean absolute difference of the distances.
+
     :todo: compute cognacy for concept slots to determine self-colexification
     scores.
     """
-    if cluster_method == "infomap":
-        cluster_function = extra.infomap_clustering
-    else:
-        cluster_function = cluster.flat_upgma
+    cache = AlignmentCache() if cache is None else cache
 
+    # assemble the words of colexifications for which we need cognate sets
+    edges, pairs = [], []
     for nA, nB, data in graph.edges(data=True):
         if data["count"] > 1:
-            # assemble languages with different cognates
-            if data["count"] == 2:
-                pair = Pairwise(data["words"][0], data["words"][1])
-                pair.align(distance=True)
-                if pair.alignments[0][2] <= threshold:
-                    weight = 1
-                else:
-                    weight = 2
-            else:
-                matrix = [[0 for _ in data["words"]] for _ in data["words"]]
-                for (i, w1), (j, w2) in combinations(
-                        enumerate(data["words"]), r=2):
-                    pair = Pairwise(w1.split(), w2.split())
-                    pair.align(distance=True)
-                    matrix[i][j] = matrix[j][i] = pair.alignments[0][2]
-
-                results = cluster_function(
-                        threshold, 
-                        matrix,
-                        taxa=data["languages"])
-                weight = len(results)
+            words = [_tokens(w, split=data["count"] > 2) for w in data["words"]]
+            edges.append((nA, nB, data, words))
+            pairs.extend(combinations(words, r=2))
         else:
-            weight = 1
-        graph[nA][nB][label] = weight
+            data[label] = 1
+    pairs = list(collections.OrderedDict.fromkeys(pairs))
+    estimates = collections.OrderedDict()
+    if prefilter:
+        for pair in pairs:
+            distance = prefilter(pair)
+            if distance is not None:
+                estimates[pair] = distance
+    cache.update([pair for pair in pairs if pair not in estimates], workers=workers)
+
+    def distance(pair):
+        return estimates[pair] if pair in estimates else cache[pair]
 
+    report = None
+    if prefilter:
+        sampled = random.Random(0).sample(list(estimates), min(sample, len(estimates)))
+        cache.update(sampled, workers=workers)
+        report = dict(
+            pairs=len(pairs),
+            skipped=len(estimates) / len(pairs) if pairs else 0,
+            sample=len(sampled),
+            disagreements=sum(
+                (estimates[pair] <= threshold) != (cache[pair] <= threshold) for pair in sampled),
+            deviation=sum(
+                abs(estimates[pair] - cache[pair]) for pair in sampled) / (len(sampled) or 1),
+        )
+    cache.save()
+
+    # assemble languages with different cognates
+    tasks = []
+    for nA, nB, data, words in edges:
+        if data["count"] > 2:
+            matrix = [[0 for _ in words] for _ in words]
+            for (i, w1), (j, w2) in combinations(enumerate(words), r=2):
+                matrix[i][j] = matrix[j][i] = distance((w1, w2))
+            tasks.append((threshold, matrix, data["languages"], cluster_method))
+    weights = iter(_map(_cognate_count, tasks, workers))
+
+    for nA, nB, data, words in edges:
+        if data["count"] == 2:
+            data[label] = 1 if distance((words[0], words[1])) <= threshold else 2
+        else:
+            data[label] = next(weights)
+    return report
 
-def get_transition_matrix(graph, steps=10, weight="weight", normalize=False):
+
+def _transition_matrix(graph, weight):
+    """
+    @returns: A triple (nodes, adjacency matrix, transition matrix), with matrices as
+        scipy.sparse CSR matrices.
+    """
+    from scipy import sparse
+
+    # prune nodes excluding singletons
+    nodes = [node for node in graph.nodes if len(graph[node]) >= 1]
+    index = {node: i for i, node in enumerate(nodes)}
+
+    rows, cols, values = [], [], []
+    for node_a, node_b, data in graph.edges(data=True):
+        idx_a, idx_b = index[node_a], index[node_b]
+        rows.append(idx_a)
+        cols.append(idx_b)
+        values.append(data[weight])
+        if idx_a != idx_b:
+            rows.append(idx_b)
+            cols.append(idx_a)
+            values.append(data[weight])
+    a_matrix = sparse.csr_matrix(
+        (np.array(values, dtype=float), (rows, cols)), shape=(len(nodes), len(nodes)))
+    diagonal = np.asarray(a_matrix.sum(axis=1)).ravel()
+    if not diagonal.all():
+        raise ZeroDivisionError('nodes with zero weight: {0}'.format(
+            [nodes[i] for i in np.flatnonzero(diagonal == 0)]))
+    return nodes, a_matrix, sparse.diags(1 / diagonal).dot(a_matrix).tocsr()
+
+
+def get_transition_matrix(
+        graph, steps=10, weight="weight", normalize=False, top_k=None, block_size=1024):
     """
     Compute transition matrix following Jackson et al. 2019
 
+    The transition probabilities are kept in a sparse matrix, and the sum of its powers is
+    accumulated for blocks of rows, with one multiplication per step. Requires `scipy`.
+
     @param graph: The graph as networkx object.
     @param steps: The number of steps in which the random walk repeats.
     @param normalize: Decide if matrix should be normalized by dividing by the number of steps.
+    @param top_k: If set, only the top_k highest scores per node are kept, and the matrices are
+        returned as scipy.sparse CSR matrices, avoiding to store the full matrix.
+    @param block_size: The number of rows computed at once.
+    @returns: A triple (transition matrix, nodes, adjacency matrix).
     """
-    # prune nodes excluding singletons
-    nodes = []
-    for node in graph.nodes:
-        if len(graph[node]) >= 1:
-            nodes.append(node)
-    a_matrix: list[list[int]] = [[0 for _ in nodes] for _ in nodes]
+    from scipy import sparse
 
-    for node_a, node_b, data in graph.edges(data=True):
-        idx_a, idx_b = nodes.index(node_a), nodes.index(node_b)
-        a_matrix[idx_a][idx_b] = a_matrix[idx_b][idx_a] = data[weight]
-    d_matrix = [[0 for _ in nodes] for _ in nodes]
-    diagonal = [sum(row) for row in a_matrix]
-    for i in range(len(nodes)):
-        d_matrix[i][i] = 1 / diagonal[i]
+    nodes, a_matrix, p_matrix = _transition_matrix(graph, weight)
 
-    p_matrix = np.matmul(d_matrix, a_matrix)
-    new_p_matrix = sum([np.linalg.matrix_power(p_matrix, i) for i in range(1,
-                                                                           steps + 1)])
+    shape, blocks = (len(nodes), len(nodes)), []
+    for start in range(0, len(nodes), block_size):
+        end = min(start + block_size, len(nodes))
+        new_p_matrix = np.zeros((end - start, len(nodes)))
+        power = p_matrix[start:end].toarray()
+        for step in range(steps):
+            if step:
+                power = power @ p_matrix
+            new_p_matrix += power
+        # we can normalize the matrix by dividing by the number of time steps
+        if normalize:
+            new_p_matrix /= steps
+        if top_k:
+            k = min(top_k, len(nodes))
+            idx = np.argpartition(-new_p_matrix, k - 1, axis=1)[:, :k]
+            new_p_matrix = sparse.csr_matrix((
+                np.take_along_axis(new_p_matrix, idx, axis=1).ravel(),
+                (np.repeat(np.arange(end - start), k), idx.ravel())),
+                shape=new_p_matrix.shape)
+        blocks.append(new_p_matrix)
 
-    # we can normalize the matrix by dividing by the number of time steps
-    if normalize:
-        new_p_matrix = new_p_matrix / steps
+    if top_k:
+        new_p_matrix = sparse.vstack(blocks, format='csr') if blocks else sparse.csr_matrix(shape)
+        return new_p_matrix, nodes, a_matrix
+    return np.vstack(blocks) if blocks else np.zeros(shape), nodes, a_matrix.toarray()
+
+
+# The transition matrix shared by processes simulating random walks, as triple of CSR arrays
+# (indptr, indices, cumulative transition probabilities within each row):
+_walk_matrix = None
 
-    return new_p_matrix, nodes, a_matrix
+
+def _init_walk_worker(walk_matrix):
+    global _walk_matrix
+    _walk_matrix = walk_matrix
+
+
+def _simulate_walks(task):
+    """
+    Simulate random walks from a block of nodes.
+
+    @returns: A triple (visit counts as scipy.sparse CSR matrix, sum of squared and maximal
+        standard error estimated from the difference between two halves of the walks).
+    """
+    from scipy import sparse
+
+    start, end, walks, steps, seed = task
+    indptr, indices, cumulative = _walk_matrix
+    size = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+
+    depth = int(np.ceil(np.log2(np.diff(indptr).max()))) if size else 0
+    sources = np.repeat(np.arange(start, end), walks)
+    halves = np.tile(np.arange(walks) % 2, end - start)
+    position, keys = sources, []
+    for _ in range(steps):
+        # Binary search for the first transition with cumulative probability above a random
+        # number, within the row of each position:
+        x = rng.random(len(position))
+        lo, hi = indptr[position], indptr[position + 1] - 1
+        for _ in range(depth):
+            mid = (lo + hi) // 2
+            below = cumulative[mid] <= x
+            lo, hi = np.where(below, mid + 1, lo), np.where(below, hi, mid)
+        position = indices[hi]
+        keys.append(((sources - start) * size + position) * 2 + halves)
+    keys, counts = np.unique(np.concatenate(keys or [np.zeros(0, dtype=int)]), return_counts=True)
+
+    def visits(half):
+        selected = keys % 2 == half
+        return sparse.csr_matrix(
+            (counts[selected], (keys[selected] // (2 * size), keys[selected] // 2 % size)),
+            shape=(end - start, size), dtype=float)
+
+    first, second = visits(0), visits(1)
+    error = abs(first / ((walks + 1) // 2) - second / (walks // 2)) / 2
+    return (first + second) / walks, float(error.multiply(error).sum()), float(
+        error.max() if error.nnz else 0)
+
+
+def estimate_transition_matrix(
+        graph,
+        steps=10,
+        weight="weight",
+        normalize=False,
+        walks=1000,
+        seed=None,
+        workers=1,
+        block_size=256):
+    """
+    Estimate the transition matrix computed by `get_transition_matrix` by simulating random walks.
+
+    For each node, `walks` random walks of length `steps` are simulated, counting the visits of
+    each node. Thus, the estimate is sparse, and memory grows with the number of visited nodes
+    rather than with the square of the number of nodes. Requires `scipy`.
+
+    @param walks: The number of random walks starting from each node (at least 2).
+    @param seed: Seed for the random number generator. Results are reproducible for a given seed,
+        independent of the number of workers.
+    @param workers: The number of processes simulating walks in parallel.
+    @param block_size: The number of nodes from which walks are simulated at once.
+    @returns: A quadruple (transition matrix, nodes, adjacency matrix, report), with matrices
+        as scipy.sparse CSR matrices, and the report as dict, listing the number of walks and
+        steps, and the root mean square and maximum of the standard error of the non-zero
+        entries, estimated from the difference between the estimates from two halves of the walks.
+    """
+    from scipy import sparse
+
+    if walks < 2:
+        raise ValueError('At least two walks per node are needed to estimate the error.')
+    nodes, a_matrix, p_matrix = _transition_matrix(graph, weight)
+    # Cumulative transition probabilities within each row, with the last one being exactly 1:
+    rows = np.repeat(np.arange(len(nodes)), np.diff(p_matrix.indptr))
+    cumulative = np.cumsum(p_matrix.data)
+    cumulative -= (cumulative - p_matrix.data)[p_matrix.indptr[:-1]][rows]
+    cumulative /= cumulative[p_matrix.indptr[1:] - 1][rows]
+    walk_matrix = (p_matrix.indptr, p_matrix.indices, cumulative)
+
+    blocks = [
+        (start, min(start + block_size, len(nodes))) for start in range(0, len(nodes), block_size)]
+    tasks = [
+        (start, end, walks, steps, seq) for (start, end), seq in
+        zip(blocks, np.random.SeedSequence(seed).spawn(len(blocks)))]
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(
+                workers, initializer=_init_walk_worker, initargs=(walk_matrix,)
+        ) as pool:
+            results = pool.map(_simulate_walks, tasks, 1)
+    else:
+        _init_walk_worker(walk_matrix)
+        results = [_simulate_walks(task) for task in tasks]
+
+    shape = (len(nodes), len(nodes))
+    new_p_matrix = sparse.vstack(
+        [block for block, _, _ in results], format='csr') if results else sparse.csr_matrix(shape)
+    scale = steps if normalize else 1
+    report = dict(
+        walks=walks,
+        steps=steps,
+        rms_error=float(np.sqrt(
+            sum(r[1] for r in results) / max(new_p_matrix.nnz, 1))) / scale,
+        max_error=max([r[2] for r in results] or [0]) / scale,
+    )
+    # we can normalize the matrix by dividing by the number of time steps
+    return new_p_matrix / scale, nodes, a_matrix, report
 
 
 def normalize_weights(graph, name, node_attr, edge_attr, factor=10, smoothing=1):
@@ -6,6 +6,7 @@ Run "clics cluster _" for a list of available cluster algorithms.
 """
 import collections
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 from networkx.readwrite import json_graph
 from tqdm import tqdm
@@ -28,8 +29,6 @@ def register(parser):
 
 
 def run(args):
-    from pyclics.util import parse_kwargs
-
     algo = args.algorithm
 
     if algo not in args.repos.cluster_algorithms:
@@ -44,12 +43,34 @@ def run(args):
         raise argparse.ArgumentError(None, '"clics makeapp" must be run first')
 
     graph = args.repos.load_graph(args.graphname, args.threshold, args.edgefilter)
+    # Bulky attributes may be stored separately, to be added for the export only:
+    attributes = args.repos.graph_attributes(args.graphname, args.threshold, args.edgefilter)
     args.log.info('graph loaded')
-    kw = vars(args)
+    cluster_names = cluster_graph(args, graph, attributes=attributes)
+    args.repos.write_js_var(algo, cluster_names, 'app', 'source', 'cluster-names.js')
+
+
+def cluster_graph(args, graph, attributes=None):
+    """
+    Cluster a graph, writing the clusters to the app and saving the clustered graph.
+
+    Only files specific to the cluster algorithm are written, thus algorithms can be run in
+    parallel, with the returned cluster names being written to `cluster-names.js` by the caller.
+
+    :param graph: The colexification graph - will be modified!
+    :return: `dict` mapping concept glosses to cluster names.
+    """
+    from pyclics.util import parse_kwargs
+
+    algo = args.algorithm
+    kw = dict(vars(args))
+    # Options of the calling command - e.g. `makeapp --workers` - must not leak into the
+    # algorithm; parallelism within an algorithm is requested as cluster argument.
+    kw.pop('workers', None)
     kw.update(parse_kwargs(*args.args))
     neighbor_weight = int(kw.pop('neighbor_weight', 5))
 
-    clusters = sorted(args.repos.get_clusterer(algo)(graph, vars(args)), key=lambda c: (-len(c), c))
+    clusters = sorted(args.repos.get_clusterer(algo)(graph, kw), key=lambda c: (-len(c), c))
     args.log.info('computed clusters')
 
     D, Com = {}, collections.defaultdict(list)
@@ -79,36 +100,8 @@ def run(args):
     args.log.info('computed cluster names')
 
     cluster_dir = args.repos.existing_dir('app', 'cluster', algo, clean=True)
-    cluster_names = {}
-    removed = []
-    for idx, nodes in tqdm(sorted(Com.items()), desc='export to app', leave=False):
-        sg = graph.subgraph(nodes)
-        for node, data in sg.nodes(data=True):
-            data['OutEdge'] = []
-            neighbors = [
-                n for n in graph if
-                n in graph[node] and
-                graph[node][n]['FamilyWeight'] >= neighbor_weight and
-                n not in sg]
-            if neighbors:
-                sg.nodes[node]['OutEdge'] = []
-                for n in neighbors:
-                    sg.nodes[node]['OutEdge'].append([
-                        graph.nodes[n]['ClusterName'],
-                        graph.nodes[n]['CentralConcept'],
-                        graph.nodes[n]['Gloss'],
-                        graph[node][n]['WordWeight'],
-                        n
-                    ])
-        if len(sg) > 1:
-            fn = cluster_dir / (
-                (str(idx) if algo == 'subgraph' else graph.nodes[nodes[0]]['ClusterName']) +
-                '.json')
-            jsonlib.dump(json_graph.adjacency_data(sg), fn, sort_keys=True)
-            for node in nodes:
-                cluster_names[graph.nodes[node]['Gloss']] = fn.stem
-        else:
-            removed += [list(nodes)[0]]
+    cluster_names, removed = export_clusters(
+        graph, Com, algo, neighbor_weight, cluster_dir, attributes=attributes)
     graph.remove_nodes_from(removed)
     for node, data in graph.nodes(data=True):
         if 'OutEdge' in data:
@@ -119,5 +112,63 @@ def run(args):
             removed += [(nA, nB)]
     graph.remove_edges_from(removed)
 
-    args.repos.save_graph(graph, algo, args.threshold, args.edgefilter)
-    args.repos.write_js_var(algo, cluster_names, 'app', 'source', 'cluster-names.js')
+    args.repos.save_graph(
+        graph, algo, args.threshold, args.edgefilter, sidecar=attributes or False)
+    return cluster_names
+
+
+def export_clusters(
+        graph, clusters, algo, neighbor_weight, cluster_dir, attributes=None, workers=4):
+    """
+    Annotate nodes with their edges to other clusters and write the clusters as JSON for the app.
+
+    :param clusters: `dict` mapping cluster indices to lists of nodes.
+    :param attributes: `AttributeStore` with bulky attributes to add to the exported data.
+    :param workers: Number of threads writing JSON files.
+    :return: Pair (`dict` mapping concept glosses to cluster names, `list` of nodes in \
+    singleton clusters).
+    """
+    # Neighbors are listed in the order of the nodes in the graph:
+    position = {n: i for i, n in enumerate(graph)}
+    cluster_names = {}
+    removed = []
+
+    def dump(data, fn):
+        if attributes:
+            attributes.enrich_adjacency_data(data)
+        jsonlib.dump(data, fn, sort_keys=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for idx, nodes in tqdm(sorted(clusters.items()), desc='export to app', leave=False):
+            members = set(nodes)
+            sg = graph.subgraph(nodes)
+            for node in nodes:
+                data = graph.nodes[node]
+                data['OutEdge'] = []
+                for n in sorted(
+                        (n for n, edge in graph[node].items()
+                         if edge['FamilyWeight'] >= neighbor_weight and n not in members),
+                        key=position.get):
+                    data['OutEdge'].append([
+                        graph.nodes[n]['ClusterName'],
+                        graph.nodes[n]['CentralConcept'],
+                        graph.nodes[n]['Gloss'],
+                        graph[node][n]['WordWeight'],
+                        n
+                    ])
+            if len(sg) > 1:
+                fn = cluster_dir / (
+                    (str(idx) if algo == 'subgraph' else graph.nodes[nodes[0]]['ClusterName']) +
+                    '.json')
+                # Nodes may be in more than one cluster, so their OutEdges are replaced when
+                # processing later clusters. Thus, the data - with copies of the node attributes -
+                # must be assembled before passing it to another thread:
+                futures.append(executor.submit(dump, json_graph.adjacency_data(sg), fn))
+                for node in nodes:
+                    cluster_names[graph.nodes[node]['Gloss']] = fn.stem
+            else:
+                removed += [list(nodes)[0]]
+        for future in futures:
+            future.result()
+    return cluster_names, removed
@@ -3,14 +3,65 @@ Compute the colexification graph
 """
 
 import csv
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 import networkx as nx
 from clldutils.clilib import Table, add_format
 
+from pyclics.edges import EdgeAccumulator
+
 
 def register(parser):
     add_format(parser, default="simple")
+    parser.add_argument(
+        "--materialized",
+        help="Read colexifications from the db, computing them only for datasets for which "
+        "they are missing.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="Re-use colexifications and concept data of datasets which did not change since the "
+        "last incremental run.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of processes computing colexifications in parallel",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--gzip",
+        help="Write the GML gzip compressed",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--sidecar",
+        help="Store the bulky attributes of nodes and edges - lists of words, languages and "
+        "families - in a SQLite db next to the network files",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--thresholds",
+        help="Sweep mode: Also write networks for each combination of these thresholds and the "
+        "edge filters given with --edgefilters (default: the global threshold)",
+        nargs="+",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--edgefilters",
+        help="Sweep mode: Also write networks for each combination of these edge filters and the "
+        "thresholds given with --thresholds (default: the global edge filter)",
+        nargs="+",
+        choices=["families", "languages", "words"],
+        default=None,
+    )
     parser.add_argument(
         "--show",
         help="Number of most common colexifications to display after computation",
@@ -34,46 +85,22 @@ def register(parser):
 def run(args):
     args.repos._log = args.log
 
-    def clean(word):
-        return "".join([w for w in word if w not in '/,;"'])
-
-    varieties = args.repos.db.varieties
+    concepts = None
+    if args.incremental:
+        args.log.info("Computing colexifications")
+        edges, concepts = args.repos.incremental_colexifications(
+            materialized=args.materialized, workers=args.workers)
 
     args.log.info("Adding nodes to the graph")
     G = nx.Graph()
-    for concept in args.repos.db.iter_concepts():
+    for concept in args.repos.db.iter_concepts(data=concepts):
         G.add_node(concept.id, **concept.as_node_attrs())
 
-    args.log.info("Adding edges to the graph")
-    for v_, formA, formB in args.repos.iter_colexifications(varieties):
-        if not G[formA.concepticon_id].get(formB.concepticon_id, False):
-            G.add_edge(
-                formA.concepticon_id,
-                formB.concepticon_id,
-                words=set(),
-                languages=set(),
-                families=set(),
-                wofam=[],
-            )
-
-        G[formA.concepticon_id][formB.concepticon_id]["words"].add(
-            (formA.gid, formB.gid)
-        )
-        G[formA.concepticon_id][formB.concepticon_id]["languages"].add(v_.gid)
-        G[formA.concepticon_id][formB.concepticon_id]["families"].add(v_.family)
-        G[formA.concepticon_id][formB.concepticon_id]["wofam"].append(
-            "/".join(
-                [
-                    formA.gid,
-                    formB.gid,
-                    formA.clics_form,
-                    v_.gid,
-                    v_.family,
-                    clean(formA.form),
-                    clean(formB.form),
-                ]
-            )
-        )
+    if not args.incremental:
+        args.log.info("Computing colexifications")
+        edges = EdgeAccumulator().update(
+            args.repos.iter_colexifications(
+                args.repos.db.varieties, materialized=args.materialized, workers=args.workers))
 
     # If either the colex2lang or colexstats files are requested,
     # build map of variety name to Glottocode, a map of concepts,
@@ -82,7 +109,7 @@ def run(args):
         lang_map = {
             "%s-%s" % (dataset_id, lang_id): glottocode
             for dataset_id, lang_id, glottocode in args.repos.db.fetchall(
-                "SELECT dataset_ID, ID, Glottocode FROM languagetable"
+                "glottocodes_by_variety"
             )
         }
 
@@ -91,103 +118,55 @@ def run(args):
         # enough data)
         concepts = defaultdict(set)
         for dataset_id, lang_id, concepticon_id in args.repos.db.fetchall(
-            """
-            SELECT f.dataset_ID, f.Language_ID, p.Concepticon_ID
-            FROM formtable AS f, parametertable AS P
-            WHERE f.Parameter_ID = p.ID AND f.dataset_ID = p.dataset_ID"""
+            "concepts_by_variety"
         ):
             concepts["%s-%s" % (dataset_id, lang_id)].add(concepticon_id)
 
-        # Iterate over all edges and collect data
-        all_counts, threshold_counts = defaultdict(int), defaultdict(int)
-        all_possible, threshold_possible = defaultdict(int), defaultdict(int)
-        colex2lang = defaultdict(set)
-        for concept_a, concept_b, data in G.edges(data=True):
-            # Collect concept2languages info
-            for lang, glottocode in lang_map.items():
-                if lang in data["languages"]:
-                    colex2lang[concept_a, concept_b].add(glottocode)
-
-            # Collect language colexification affinity (David Gil's request)
-            # Don't consider the edge if we don't have at least one language in it
-            if not data["languages"]:
-                continue
-
-            # Check if the current concept pair passes the threshold filter
-            filter_family, filter_lang, filter_words = True, True, True
-            if args.edgefilter == "families":
-                filter_family = len(data["families"]) >= args.threshold
-            if args.edgefilter == "languages":
-                filter_lang = len(data["languages"]) >= args.threshold
-            if args.edgefilter == "words":
-                filter_words = len(data["words"]) >= args.threshold
-            pass_filter = all([filter_family, filter_lang, filter_words])
-
-            # Inspect all languages
-            for lang in lang_map:
-                if lang in data["languages"]:
-                    all_counts[lang] += 1
-                    all_possible[lang] += 1
-                    if pass_filter:
-                        threshold_counts[lang] += 1
-                        threshold_possible[lang] += 1
-                else:
-                    if concept_a in concepts[lang] and concept_b in concepts[lang]:
-                        all_possible[lang] += 1
-                        if pass_filter:
-                            threshold_possible[lang] += 1
-
-    edges = {}
-    for edgeA, edgeB, data in G.edges(data=True):
-        edges[edgeA, edgeB] = (
-            len(data["families"]),
-            len(data["languages"]),
-            len(data["words"]),
-        )
-
-    ignore_edges = []
-    for edgeA, edgeB, data in G.edges(data=True):
-        data["WordWeight"] = len(data["words"])
-        data["words"] = ";".join(
-            sorted(["{0}/{1}".format(x, y) for x, y in data["words"]])
-        )
-        data["FamilyWeight"] = len(data["families"])
-        data["families"] = ";".join(sorted(data["families"]))
-        data["LanguageWeight"] = len(data["languages"])
-        data["languages"] = ";".join(data["languages"])
-        data["wofam"] = ";".join(data["wofam"])
-        if args.edgefilter == "families" and data["FamilyWeight"] < args.threshold:
-            ignore_edges.append((edgeA, edgeB))
-        elif args.edgefilter == "languages" and data["LanguageWeight"] < args.threshold:
-            ignore_edges.append((edgeA, edgeB))
-        elif args.edgefilter == "words" and data["WordWeight"] < args.threshold:
-            ignore_edges.append((edgeA, edgeB))
-
-    G.remove_edges_from(ignore_edges)
+        colex2lang = OrderedDict()
+        for concept_a, concept_b, edge in edges.iter_edges(nodes=G):
+            glottocodes = {lang_map[lang] for lang in edges.languages(edge) if lang in lang_map}
+            if glottocodes:
+                # Note: Glottocodes are sorted, to make the output reproducible.
+                colex2lang[concept_a, concept_b] = sorted(glottocodes)
+
+        # Collect language colexification affinity (David Gil's request)
+        stats = edges.language_stats(
+            {lang: concepts[lang] for lang in lang_map}, args.threshold, args.edgefilter)
+
+    # Keep a graph without edges, to add edges for other settings in sweep mode:
+    nodes = G.copy() if args.thresholds or args.edgefilters else None
+
+    args.log.info("Adding edges to the graph")
+    edges.add_to_graph(G, args.threshold, args.edgefilter)
 
     nodenames = {
         r[0]: r[1]
-        for r in args.repos.db.fetchall(
-            "select distinct concepticon_id, concepticon_gloss from parametertable"
-        )
+        for r in args.repos.db.fetchall("concept_glosses")
     }
 
     with Table(
         args, "ID A", "Concept A", "ID B", "Concept B", "Families", "Languages", "Words"
     ) as table:
-        count = 0
+        weights = [
+            ((nodeA, nodeB), (d["FamilyWeight"], d["LanguageWeight"], d["WordWeight"]))
+            for nodeA, nodeB, d in G.edges(data=True)
+        ]
         for (nodeA, nodeB), (fc, lc, wc) in sorted(
-            edges.items(), key=lambda i: i[1], reverse=True
-        ):
-            if (nodeA, nodeB) not in ignore_edges:
-                table.append(
-                    [nodeA, nodenames[nodeA], nodeB, nodenames[nodeB], fc, lc, wc]
-                )
-                count += 1
-            if count >= args.show:
-                break
-
-    print(args.repos.save_graph(G, args.graphname, args.threshold, args.edgefilter))
+            weights, key=lambda i: i[1], reverse=True
+        )[:args.show]:
+            table.append([nodeA, nodenames[nodeA], nodeB, nodenames[nodeB], fc, lc, wc])
+
+    print(args.repos.save_graph(
+        G,
+        args.graphname,
+        args.threshold,
+        args.edgefilter,
+        formats=formats(args),
+        sidecar=args.sidecar,
+    ))
+
+    if nodes is not None:
+        sweep(args, edges, nodes)
 
     # Output colex2lang info
     if args.colex2lang:
@@ -217,9 +196,41 @@ def run(args):
                     {
                         "LANG_KEY": lang,
                         "GLOTTOCODE": lang_map[lang],
-                        "COLEXIFICATIONS_ALL": all_counts[lang],
-                        "POTENTIAL_ALL": all_possible[lang],
-                        "COLEXIFICATIONS_THRESHOLD": threshold_counts[lang],
-                        "POTENTIAL_THRESHOLD": threshold_possible[lang],
+                        "COLEXIFICATIONS_ALL": stats[lang][0],
+                        "POTENTIAL_ALL": stats[lang][1],
+                        "COLEXIFICATIONS_THRESHOLD": stats[lang][2],
+                        "POTENTIAL_THRESHOLD": stats[lang][3],
                     }
                 )
+
+
+def formats(args):
+    return ("gml.gz" if args.gzip else "gml", "bin")
+
+
+def sweep(args, edges, nodes):
+    """
+    Write networks for all combinations of thresholds and edge filters, re-using the computed
+    colexifications, and a summary table of the networks.
+    """
+    with args.repos.csv_writer(
+            "graphs", "{0}-sweep".format(args.graphname), delimiter="\t", suffix="tsv") as writer:
+        writer.writerow(["Threshold", "EdgeFilter", "Nodes", "Edges", "Components", "Path"])
+        for edgefilter in args.edgefilters or [args.edgefilter]:
+            for threshold in args.thresholds or [args.threshold]:
+                graph = nodes.copy()
+                edges.add_to_graph(graph, threshold, edgefilter)
+                path = args.repos.save_graph(
+                    graph,
+                    args.graphname,
+                    threshold,
+                    edgefilter,
+                    formats=formats(args),
+                    sidecar=args.sidecar)
+                writer.writerow([
+                    threshold,
+                    edgefilter,
+                    graph.number_of_nodes(),
+                    graph.number_of_edges(),
+                    nx.number_connected_components(graph),
+                    path.name])
@@ -64,16 +64,7 @@ def run(args):
             '',
             'TOTAL',
             0,
-            args.repos.db.fetchone(
-                """\
-select
-    count(distinct p.concepticon_id) from parametertable as p, formtable as f, languagetable as l
-where
-    f.parameter_id = p.id and f.dataset_id = p.dataset_id
-    and f.language_id = l.id and f.dataset_id = l.dataset_id
-    and l.glottocode is not null
-    and l.family != 'Bookkeeping'
-""")[0],
+            args.repos.db.fetchone('concepts_in_varieties')[0],
             len(varieties),
             len(set(v.glottocode for v in varieties)),
             len(set(v.family for v in varieties))
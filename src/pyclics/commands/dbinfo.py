@@ -0,0 +1,38 @@
+"""
+Display query plans and timings for the SQL queries run on the CLICS database.
+
+Plan steps starting with "SCAN" (rather than "SEARCH") read a full table.
+"""
+import sqlite3
+
+from clldutils.clilib import Table, add_format
+
+
+def register(parser):
+    add_format(parser, default='simple')
+    parser.add_argument(
+        '--create-indexes',
+        help="Create missing indexes (e.g. for databases loaded with older versions of pyclics)",
+        action='store_true',
+        default=False)
+
+
+def run(args):
+    db = args.repos.db
+    if args.create_indexes:
+        db.create_indexes()
+
+    # Parametrized queries - for a dataset or a variety - are run for the first variety in the db:
+    params = {0: None}
+    for v in db.varieties[:1]:
+        params.update({1: (v.source,), 2: (v.id, v.source)})
+    with Table(args, 'Query', 'Rows', 'Seconds', 'Plan') as table:
+        for name, sql in sorted(db.sql.items()):
+            if sql.count('?') not in params:  # pragma: no cover
+                continue
+            try:
+                plan, nrows, seconds = db.explain(name, params[sql.count('?')])
+            except sqlite3.OperationalError as e:  # e.g. colexifications not materialized.
+                table.append([name, '', '', str(e)])
+                continue
+            table.append([name, nrows, '{0:.3f}'.format(seconds), '\n'.join(plan)])
@@ -36,7 +36,7 @@ def run(args):
 
     langs_by_family, isolates = {}, []
     for family, langs in itertools.groupby(
-        args.api.db.fetchall("select id, glottocode, family from languagetable order by family"),
+        args.api.db.fetchall("glottocodes_by_family"),
         lambda r: r[2],
     ):
         langs = nfilter([valid_languoid(gc) for gc in set(l[1] for l in langs)])
@@ -8,13 +8,40 @@ from cldfbench import iter_datasets
 from cldfbench.cli_util import add_catalog_spec
 
 from pyclics import interfaces
-from pyclics.util import CATALOGS, catalog
+from pyclics.db import dataset_spec
+from pyclics.util import CATALOGS, catalog, implementation_name
 
 
 def register(parser):
     for cat in CATALOGS:
         add_catalog_spec(parser, cat)
     parser.add_argument('--unloaded', action='store_true', default=False)
+    parser.add_argument(
+        '--force',
+        help="Re-load datasets even if the data has not changed since it was loaded",
+        action='store_true',
+        default=False)
+    parser.add_argument(
+        '--workers',
+        help="Number of processes reading the datasets in parallel",
+        type=int,
+        default=1)
+    parser.add_argument(
+        '--bulk',
+        help="Load in bulk mode, i.e. with tuned SQLite settings, creating indexes and purging "
+             "problematic data only after all datasets are loaded",
+        action='store_true',
+        default=False)
+
+
+def purge(args, dataset_ids):
+    n, c = args.api.db.purge(dataset_ids)
+    if n:  # pragma: no cover
+        # This should not have happened anyway, because Form is marked as required in
+        # the default csvw metadata.
+        args.log.info('purging {0} empty forms from db'.format(n))
+    if c:
+        args.log.info('purging {0} problematic concepts from db.'.format(c))
 
 
 def run(args):
@@ -22,8 +49,8 @@ def run(args):
         for name in CATALOGS:
             setattr(args, name, stack.enter_context(catalog(name, args)))
 
-        args.log.info('using {0.__name__} implementation {1.__module__}:{1.__name__}'.format(
-            interfaces.IClicsForm, args.api.clicsform))
+        args.log.info('using {0.__name__} implementation {1}'.format(
+            interfaces.IClicsForm, implementation_name(args.api.clicsform)))
         args.api.db.create(exists_ok=True)
         args.log.info('loading datasets into {0}'.format(args.api.db.fname))
         try:
@@ -33,30 +60,28 @@ def run(args):
             args.log.error('You may re-load all datasets after first removing {0}.'.format(
                 args.api.db.fname))
             return
+        fingerprints, specs = args.api.db.fingerprints, []
         for ds in iter_datasets(ep='lexibank.dataset'):
             if args.unloaded and ds.id in in_db:
                 args.log.info('skipping {0} - already loaded'.format(ds.id))
                 continue
-            args.log.info('loading {0}'.format(ds.id))
-            args.api.db.load(ds)
-            with args.api.db.connection() as conn:
-                from_clause = "FROM formtable WHERE form IS NULL"
-                conc_id_fix = "FROM parametertable WHERE Concepticon_ID IS NULL"
-
-                n = args.api.db.fetchone("SELECT count(id) " + from_clause, conn=conn)[0]
-                c = args.api.db.fetchone("SELECT count(id) " + conc_id_fix, conn=conn)[0]
-
-                if n:  # pragma: no cover
-                    # This should not have happened anyway, because Form is marked as required in
-                    # the default csvw metadata.
-                    args.log.info('purging {0} empty forms from db'.format(n))
-                    conn.execute("DELETE " + from_clause)
-                    conn.commit()
+            spec = dataset_spec(ds, args.api.clicsform)
+            if (not args.force) and fingerprints.get(ds.id) == spec[-1]:
+                args.log.info('skipping {0} - unchanged'.format(ds.id))
+                continue
+            specs.append(spec)
 
-                if c:
-                    args.log.info('purging {0} problematic concepts from db.'.format(c))
-                    conn.execute("DELETE " + conc_id_fix)
-                    conn.commit()
+        with contextlib.ExitStack() as bulk:
+            if args.bulk:
+                bulk.enter_context(args.api.db.bulk_load())
+            loaded = []
+            for dsid in args.api.db.load_datasets(specs, workers=args.workers):
+                args.log.info('loaded {0}'.format(dsid))
+                loaded.append(dsid)
+                if not args.bulk:
+                    purge(args, [dsid])
+            if args.bulk:
+                purge(args, loaded)
 
         args.log.info('loading Concepticon data')
         args.api.db.load_concepticon_data(args.concepticon.api)
@@ -3,10 +3,15 @@ Create a local Javascript-powered app to explore a colexification network.
 
 Note: Requires free disk space in the order of 2GB if subgraph clustering is computed.
 """
-import pathlib
+import zlib
+import random
 import shutil
+import pathlib
+import argparse
 import collections
+import multiprocessing
 
+import numpy
 import geojson
 
 from pyclics.commands import cluster
@@ -20,6 +25,20 @@ def register(parser):
         help="Cluster algorithms to run, formatted as 'METHOD[arg=value[;arg=value]]'",
         default=['subgraph', 'infomap'],
     )
+    parser.add_argument(
+        '--materialized',
+        help="Read colexifications from the db, computing them only for datasets for which "
+             "they are missing.",
+        action='store_true',
+        default=False,
+    )
+    parser.add_argument(
+        '--workers',
+        help="Number of processes computing colexifications and running cluster algorithms "
+             "in parallel",
+        type=int,
+        default=1,
+    )
 
 
 def parse_cluster_method(s):
@@ -48,16 +67,73 @@ def run(args):
         app_source.joinpath('cluster-names.js').unlink()
 
     words = collections.OrderedDict()
-    for _, formA, formB in args.repos.iter_colexifications(varieties):
+    for _, formA, formB in args.repos.iter_colexifications(
+            varieties, materialized=args.materialized, workers=args.workers):
         words[formA.gid] = [formA.clics_form, formA.form]
     args.repos.json_dump(words, 'app', 'source', 'words.json')
 
     clusters = [parse_cluster_method(s) for s in args.cluster]
-    for algo, arg in clusters:
-        args.log.info('clustering ({0}[{1}]) ...'.format(algo, arg))
-        args.algorithm = algo
-        args.args = arg
-        cluster.run(args)
+    if args.workers > 1 and len(clusters) > 1 \
+            and 'fork' in multiprocessing.get_all_start_methods() \
+            and len(set(algo for algo, _ in clusters)) == len(clusters) \
+            and all(algo in args.repos.cluster_algorithms for algo, _ in clusters):
+        run_clusterers(args, clusters)
+    else:
+        for algo, arg in clusters:
+            args.log.info('clustering ({0}[{1}]) ...'.format(algo, arg))
+            seed(args, algo)
+            args.algorithm = algo
+            args.args = arg
+            cluster.run(args)
     print("""Run
     clics runapp
 to open the app in a browser.""")
+
+
+def seed(args, algo):
+    """
+    Seed the random number generators for a cluster algorithm.
+
+    The seed is derived from `--seed` and the name of the algorithm, so the results of randomized
+    algorithms do not depend on which algorithms were run before in the same process - and are
+    the same whether algorithms are run sequentially or in parallel.
+    """
+    if args.seed is not None:
+        s = zlib.crc32('{0}:{1}'.format(args.seed, algo).encode('utf8'))
+        random.seed(s)
+        numpy.random.seed(s)
+
+
+# The arguments, graph and attributes shared by the processes running cluster algorithms:
+_shared = None
+
+
+def _run_clusterer(method):
+    args, graph, attributes = _shared
+    args = argparse.Namespace(**vars(args))
+    args.algorithm, args.args = method
+    args.log.info('clustering ({0}[{1}]) ...'.format(*method))
+    # Forked processes inherit the state of the random number generators from the parent, and
+    # each process may run several algorithms, thus we seed per algorithm:
+    seed(args, args.algorithm)
+    return cluster.cluster_graph(args, graph, attributes=attributes)
+
+
+def run_clusterers(args, clusters):
+    """
+    Run cluster algorithms in parallel, in forked processes sharing one loaded graph.
+
+    :param clusters: `list` of (algorithm, arguments) pairs, with distinct algorithms.
+    """
+    global _shared
+    graph = args.repos.load_graph(args.graphname, args.threshold, args.edgefilter)
+    attributes = args.repos.graph_attributes(args.graphname, args.threshold, args.edgefilter)
+    _shared = (args, graph, attributes)
+    try:
+        with multiprocessing.get_context('fork').Pool(min(args.workers, len(clusters))) as pool:
+            results = pool.map(_run_clusterer, clusters, chunksize=1)
+    finally:
+        _shared = None
+    # `cluster-names.js` is shared by all algorithms, so we update it sequentially:
+    for (algo, _), cluster_names in zip(clusters, results):
+        args.repos.write_js_var(algo, cluster_names, 'app', 'source', 'cluster-names.js')
@@ -1,18 +1,142 @@
-import string
+import json
+import time
+import hashlib
+import pathlib
+import sqlite3
+import itertools
+import contextlib
+import collections
+from concurrent.futures import ProcessPoolExecutor
 
-from unidecode import unidecode
-from pylexibank.db import Database as Database_
+import attr
+from clldutils.misc import nfilter
+from clldutils.path import md5
+from pycldf import Dataset
+from pycldf.sources import Sources
+from pylexibank.db import Database as Database_, BIBTEX_FIELDS, schema, insert
 
 from pyclics.models import Form, Concept, Variety
+from pyclics.util import implementation_name
+from pyclics.plugin import ALLOWED_CHARACTERS, TRANSLATION_TABLE  # noqa: F401
 
 __all__ = ['Database']
 
-# unidecode converts "ə" to "@"
-ALLOWED_CHARACTERS = string.ascii_letters + string.digits + '@'
+# Indexes supporting the lookups run by pyclics, specified as (name, table, columns) triples.
+# The indexes on FormTable are covering indexes for the respective queries.
+INDEXES = [
+    (
+        'clics_form_by_language',
+        'FormTable',
+        ['dataset_ID', 'Language_ID', 'clics_form', 'Parameter_ID', 'ID', 'Form']),
+    ('clics_form_by_parameter', 'FormTable', ['Parameter_ID', 'dataset_ID', 'Language_ID', 'ID']),
+    ('clics_form_language', 'FormTable', ['Language_ID']),
+    ('clics_parameter_by_concept', 'ParameterTable', ['Concepticon_ID', 'dataset_ID', 'ID']),
+    ('clics_language_glottocode', 'LanguageTable', ['Glottocode']),
+]
+# Settings for connections while bulk loading, trading durability for speed. Since the data can
+# always be re-loaded from the datasets, losing it in case of a crash is acceptable.
+BULK_LOAD_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA cache_size = -1048576',  # i.e. 1GB
+]
+
+# Forms of a wordlist must be ordered by `clics_form` for `IColexifier`s, thus we order the
+# forms of all wordlists by dataset and language first, so they can be grouped in one scan.
+WORDLIST_SQL = """\
+select
+    f.id, f.dataset_id, f.form, f.clics_form,
+    p.name, p.concepticon_id, p.concepticon_gloss, p.ontological_category, p.semantic_field,
+    f.dataset_id, f.language_id
+from
+    formtable as f, parametertable as p
+where
+    f.parameter_id = p.id
+    and f.dataset_id = p.dataset_id
+    and p.concepticon_id is not null
+    {0}
+order by
+    f.dataset_id, f.language_id, f.clics_form, p.concepticon_id, f.id"""
+
+# Rows are ordered by dataset within a concept - matching `clics_parameter_by_concept` - so that
+# metadata of concepts merged from per-dataset data comes out in the same order.
+CONCEPT_FORMS_SQL = """\
+select
+    p.concepticon_id, p.concepticon_gloss, p.ontological_category, p.semantic_field,
+    f.dataset_id || '-' || f.language_id, l.family, f.dataset_id || '-' || f.id
+from
+    parametertable as p
+    left join formtable as f on f.parameter_id = p.id and f.dataset_id = p.dataset_id
+    left join languagetable as l on f.language_id = l.id and f.dataset_id = l.dataset_id
+where
+    p.concepticon_id is not null
+    {0}
+order by
+    p.concepticon_id, p.dataset_id, p.id"""
 
 
 def clics_form(word):
-    return ''.join(c for c in unidecode(word) if c in ALLOWED_CHARACTERS).lower()
+    return word.translate(TRANSLATION_TABLE)
+
+
+@attr.s
+class TableData(object):
+    """
+    Schema and rows of a table of a CLDF dataset.
+    """
+    name = attr.ib()
+    sql = attr.ib()
+    columns = attr.ib(default=attr.Factory(list))
+    keys = attr.ib(default=attr.Factory(list))
+    rows = attr.ib(default=attr.Factory(list))
+
+
+@attr.s
+class DatasetData(object):
+    """
+    The data of a CLDF dataset, prepared for insertion into the database.
+
+    Since `DatasetData` objects can be pickled, they can be prepared in separate processes.
+    """
+    id = attr.ib()
+    name = attr.ib()
+    version = attr.ib()
+    metadata_json = attr.ib()
+    properties = attr.ib(default=attr.Factory(list))
+    sources = attr.ib(default=attr.Factory(list))
+    tables = attr.ib(default=attr.Factory(list))
+    ref_tables = attr.ib(default=attr.Factory(list))
+    refs = attr.ib(default=attr.Factory(list))
+    fingerprint = attr.ib(default=None)
+
+
+def fingerprint(metadata, version, clics_form):
+    """
+    Compute a fingerprint of the data loaded from a CLDF dataset.
+
+    The fingerprint changes if the dataset version, any of the files in the CLDF directory or \
+    the `IClicsForm` implementation used to derive `clics_form` changes.
+    """
+    res = hashlib.md5('{0} {1}'.format(version, implementation_name(clics_form)).encode('utf8'))
+    for p in sorted(pathlib.Path(metadata).parent.iterdir(), key=lambda p: p.name):
+        if p.is_file():
+            res.update('{0} {1}'.format(p.name, md5(p)).encode('utf8'))
+    return res.hexdigest()
+
+
+def dataset_spec(ds, clics_form):
+    """
+    :return: `tuple` (ID, path of CLDF metadata, version, fingerprint) specifying a lexibank \
+    dataset.
+    """
+    metadata = ds.cldf_specs_dict[None].metadata_path
+    version = ds.repo.hash() if ds.repo else ''
+    return ds.id, metadata, version, fingerprint(metadata, version, clics_form)
+
+
+def _read(args):
+    fname, clics_form, spec = args
+    return Database(fname, clics_form).read(*spec)
 
 
 class Database(Database_):
@@ -27,10 +151,93 @@ FROM
 WHERE
     ds.id = p.dataset_id and f.dataset_id = ds.id and f.parameter_id = p.id
 GROUP BY ds.id"""
+    Database_.sql["concepts_in_varieties"] = """\
+select
+    count(distinct p.concepticon_id) from parametertable as p, formtable as f, languagetable as l
+where
+    f.parameter_id = p.id and f.dataset_id = p.dataset_id
+    and f.language_id = l.id and f.dataset_id = l.dataset_id
+    and l.glottocode is not null
+    and l.family != 'Bookkeeping'"""
+    Database_.sql["varieties"] = """\
+select * from (
+select
+    l.id, l.dataset_id, l.name, l.glottocode, l.family, l.macroarea, l.longitude, l.latitude
+from
+    languagetable as l
+where
+    l.glottocode is not null
+    and l.family != 'Bookkeeping'
+group by
+    l.id, l.dataset_id
+order by
+    l.dataset_id, l.id
+)
+where id in (select distinct language_id from formtable)"""
+    Database_.sql["wordlists"] = WORDLIST_SQL.format('')
+    Database_.sql["dataset_wordlists"] = WORDLIST_SQL.format('and f.dataset_id = ?')
+    Database_.sql["wordlist"] = WORDLIST_SQL.format('and f.language_id = ? and f.dataset_id = ?')
+    # All forms of all concepts, ordered by concept, to be grouped in one scan:
+    Database_.sql["concept_forms"] = CONCEPT_FORMS_SQL.format('')
+    Database_.sql["dataset_concept_forms"] = CONCEPT_FORMS_SQL.format('and p.dataset_id = ?')
+    Database_.sql["glottocodes_by_variety"] = """\
+SELECT dataset_ID, ID, Glottocode FROM languagetable"""
+    Database_.sql["concepts_by_variety"] = """\
+SELECT f.dataset_ID, f.Language_ID, p.Concepticon_ID
+FROM formtable AS f, parametertable AS P
+WHERE f.Parameter_ID = p.ID AND f.dataset_ID = p.dataset_ID"""
+    Database_.sql["concept_glosses"] = """\
+select distinct concepticon_id, concepticon_gloss from parametertable"""
+    Database_.sql["glottocodes_by_family"] = """\
+select id, glottocode, family from languagetable order by family"""
+    Database_.sql["colexifications"] = """\
+select
+    fa.id, fa.dataset_id, fa.form, fa.clics_form,
+    pa.name, pa.concepticon_id, pa.concepticon_gloss, pa.ontological_category, pa.semantic_field,
+    fb.id, fb.dataset_id, fb.form, fb.clics_form,
+    pb.name, pb.concepticon_id, pb.concepticon_gloss, pb.ontological_category, pb.semantic_field,
+    c.dataset_ID, c.Language_ID
+from
+    colexification as c,
+    formtable as fa, parametertable as pa,
+    formtable as fb, parametertable as pb
+where
+    c.dataset_ID = fa.dataset_id and c.FormA_ID = fa.id
+    and fa.dataset_id = pa.dataset_id and fa.parameter_id = pa.id
+    and c.dataset_ID = fb.dataset_id and c.FormB_ID = fb.id
+    and fb.dataset_id = pb.dataset_id and fb.parameter_id = pb.id
+order by
+    c.dataset_ID, c.Language_ID, c.ID"""
 
     def __init__(self, fname, clics_form):
         Database_.__init__(self, fname)
         self.clics_form = clics_form
+        self._bulk_load = False
+
+    def connection(self):
+        conn = sqlite3.connect(self.fname.as_posix())
+        if self._bulk_load:
+            for pragma in BULK_LOAD_PRAGMAS:
+                conn.execute(pragma)
+        return contextlib.closing(conn)
+
+    @contextlib.contextmanager
+    def bulk_load(self):
+        """
+        Context manager to speed up loading many datasets.
+
+        Within the context, connections use `BULK_LOAD_PRAGMAS` and indexes are only (re-)created
+        when leaving the context.
+        """
+        self.drop_indexes()
+        self._bulk_load = True
+        try:
+            yield self
+        finally:
+            self._bulk_load = False
+            self.create_indexes()
+            with self.connection() as conn:
+                conn.execute('PRAGMA journal_mode = DELETE')
 
     def _datasets(self):
         return self.fetchall("select id, version from dataset")
@@ -57,110 +264,449 @@ GROUP BY ds.id"""
                 with self.connection() as conn:
                     conn.execute("ALTER TABLE {0} ADD COLUMN `{1}` {2}".format(
                         tname, cname, type_))
+        with self.connection() as conn:
+            conn.execute("""\
+CREATE TABLE IF NOT EXISTS datasetfingerprint (
+    dataset_ID TEXT PRIMARY KEY NOT NULL,
+    fingerprint TEXT,
+    FOREIGN KEY(dataset_ID) REFERENCES dataset(ID)
+)""")
+        if not self._bulk_load:
+            self.create_indexes()
 
-    def update_row(self, table, keys, values):
-        if table == 'FormTable':
-            d = dict(zip(keys, values))
-            keys = list(keys) + ['`clics_form`']
-            values = list(values) + [self.clics_form(d['`Form`'])]
-        return keys, values
+    def create_indexes(self):
+        """
+        Create the indexes used by pyclics' queries - if they do not exist yet.
+
+        Since the indexes are part of the schema, SQLite will keep them up-to-date when data is
+        added or removed.
+        """
+        tables = self.tables
+        with self.connection() as conn:
+            for name, tname, cols in INDEXES:
+                if tname in tables:
+                    conn.execute("CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})".format(
+                        name, tname, ', '.join('`{0}`'.format(col) for col in cols)))
+            conn.commit()
+
+    def drop_indexes(self):
+        with self.connection() as conn:
+            for name, _, _ in INDEXES:
+                conn.execute("DROP INDEX IF EXISTS {0}".format(name))
+            conn.commit()
+
+    def purge(self, dataset_ids):
+        """
+        Remove forms without form and parameters without Concepticon mapping.
+
+        :param dataset_ids: IDs of the datasets to purge.
+        :return: Pair (number of purged forms, number of purged parameters).
+        """
+        nforms, nparameters = 0, 0
+        with self.connection() as conn:
+            for dsid in dataset_ids:
+                nforms += conn.execute(
+                    "DELETE FROM formtable WHERE form IS NULL AND dataset_ID = ?",
+                    (dsid,)).rowcount
+                nparameters += conn.execute(
+                    "DELETE FROM parametertable WHERE Concepticon_ID IS NULL AND dataset_ID = ?",
+                    (dsid,)).rowcount
+            conn.commit()
+        return nforms, nparameters
+
+    def _create_colexification_tables(self, conn):
+        conn.execute("""\
+CREATE TABLE IF NOT EXISTS colexification (
+    ID INTEGER PRIMARY KEY,
+    dataset_ID TEXT NOT NULL,
+    Language_ID TEXT,
+    FormA_ID TEXT,
+    FormB_ID TEXT,
+    ConceptA_ID TEXT,
+    ConceptB_ID TEXT,
+    FOREIGN KEY(dataset_ID) REFERENCES dataset(ID)
+)""")
+        conn.execute("""\
+CREATE INDEX IF NOT EXISTS clics_colexification_by_language
+ON colexification (dataset_ID, Language_ID, ID)""")
+        # We keep track of the configuration - i.e. `IColexifier` and `IClicsForm` - used to
+        # compute the colexifications of each dataset:
+        conn.execute("""\
+CREATE TABLE IF NOT EXISTS colexificationconfig (
+    dataset_ID TEXT PRIMARY KEY NOT NULL,
+    config TEXT,
+    FOREIGN KEY(dataset_ID) REFERENCES dataset(ID)
+)""")
+
+    @property
+    def colexification_configs(self):
+        """
+        :return: `dict` mapping dataset IDs to the configuration used to compute the \
+        materialized colexifications.
+        """
+        try:
+            return dict(self.fetchall("select dataset_ID, config from colexificationconfig"))
+        except sqlite3.OperationalError:  # No colexifications materialized yet.
+            return {}
+
+    def write_colexifications(self, config, dataset_ids, colexifications):
+        """
+        Replace the materialized colexifications for a set of datasets.
+
+        :param config: `str` identifying the colexification configuration.
+        :param dataset_ids: IDs of the datasets for which colexifications are written.
+        :param colexifications: Iterable of (variety, formA, formB) triples.
+        """
+        with self.connection() as conn:
+            self._create_colexification_tables(conn)
+            for dsid in dataset_ids:
+                for table in ['colexification', 'colexificationconfig']:
+                    conn.execute(
+                        "DELETE FROM {0} WHERE dataset_ID = ?".format(table), (dsid,))
+            conn.executemany(
+                """\
+INSERT INTO colexification
+    (dataset_ID, Language_ID, FormA_ID, FormB_ID, ConceptA_ID, ConceptB_ID)
+VALUES (?, ?, ?, ?, ?, ?)""",
+                ((v.source, v.id, a.id, b.id, a.concepticon_id, b.concepticon_id)
+                 for v, a, b in colexifications))
+            conn.executemany(
+                "INSERT INTO colexificationconfig (dataset_ID, config) VALUES (?, ?)",
+                [(dsid, config) for dsid in dataset_ids])
+            conn.commit()
+
+    def iter_colexifications(self, varieties):
+        """
+        Read materialized colexifications.
+
+        :return: Generator of (variety, formA, formB) triples, ordered like the output of \
+        `Clics.iter_colexifications`.
+        """
+        languages = {(v.source, v.id): v for v in varieties}
+        for row in self.iter_rows('colexifications'):
+            v = languages.get(row[-2:])
+            if v:
+                yield v, Form(*row[:9]), Form(*row[9:18])
+
+    def explain(self, sql, params=None):
+        """
+        :return: Triple (query plan, number of result rows, seconds to fetch all results).
+        """
+        plan = [r[-1] for r in self.fetchall(
+            'EXPLAIN QUERY PLAN ' + self.sql.get(sql, sql), params=params)]
+        start = time.time()
+        nrows = len(self.fetchall(sql, params=params))
+        return plan, nrows, time.time() - start
+
+    def read(self, dsid, metadata, version, fingerprint=None):
+        """
+        Read a CLDF dataset and prepare the rows for insertion into the database.
+
+        :return: `DatasetData` instance.
+        """
+        dataset = Dataset.from_metadata(metadata)
+        tables, ref_tables = schema(dataset)
+        res = DatasetData(
+            dsid,
+            '{0}'.format(dataset),
+            version,
+            json.dumps(dataset.metadata_dict),
+            properties=[(dsid, k, '{0}'.format(v)) for k, v in dataset.properties.items()],
+            ref_tables=[TableData(t.name, t.sql) for t in ref_tables.values()],
+            fingerprint=fingerprint)
+
+        for src in dataset.sources.items():
+            values = [dsid, src.id, src.genre] + [src.get(k) for k in BIBTEX_FIELDS]
+            values.append(json.dumps({k: v for k, v in src.items() if k not in BIBTEX_FIELDS}))
+            res.sources.append(tuple(values))
+
+        # For regular tables, we extract and keep references to sources.
+        refs = collections.defaultdict(list)
+        for t in tables:
+            # We want to lookup columns by the name used in the CLDF dataset.
+            cols = {col.cldf_name: col for col in t.columns}
+            # But we also want to look up primary keys by the database column name.
+            cols_by_name = {col.name: col for col in t.columns}
+
+            ref_table = ref_tables.get(t.name)
+            table = TableData(t.name, t.sql, [(col.name, col.db_type) for col in t.columns])
+            try:
+                for row in dataset[t.name]:
+                    keys, values = ['dataset_ID'], [dsid]
+                    for k, v in row.items():
+                        if ref_table and k == ref_table.consumes:
+                            col = cols_by_name[t.primary_key]
+                            refs[ref_table.name].append((row[col.cldf_name], v))
+                        else:
+                            col = cols[k]
+                            if isinstance(v, list):
+                                v = (col.separator or ';').join(
+                                    nfilter(col.convert(vv) for vv in v))
+                            else:
+                                v = col.convert(v)
+                            keys.append("`{0}`".format(col.name))
+                            values.append(v)
+                    table.keys, values = self.update_row(t.name, keys, values)
+                    table.rows.append(tuple(values))
+            except FileNotFoundError:
+                if t.name != 'CognateTable':  # An empty CognateTable is allowed.
+                    raise  # pragma: no cover
+            if t.name == 'FormTable' and table.rows:
+                # The CLICS forms are computed for the whole column at once:
+                words = [row[table.keys.index('`Form`')] for row in table.rows]
+                table.keys = list(table.keys) + ['`clics_form`']
+                table.rows = [
+                    row + (cf,) for row, cf in zip(table.rows, self.clics_forms(words))]
+            res.tables.append(table)
+
+        # Now collect the references, i.e. the associations with sources:
+        for tname, items in refs.items():
+            rows = []
+            for oid, sources in items:
+                for source in sources:
+                    sid, context = Sources.parse(source)
+                    rows.append([dsid, oid, sid, context])
+            oid_col = '{0}_ID'.format(tname.replace('Source', ''))
+            res.refs.append((tname, ['dataset_ID', oid_col, 'Source_ID', 'Context'], rows))
+        return res
+
+    @property
+    def fingerprints(self):
+        """
+        :return: `dict` mapping dataset IDs to the fingerprints of the loaded data.
+        """
+        try:
+            return dict(self.fetchall("select dataset_ID, fingerprint from datasetfingerprint"))
+        except sqlite3.OperationalError:  # The database was loaded with an older pyclics.
+            return {}
+
+    @property
+    def catalog_digests(self):
+        """
+        Data added from Glottolog and Concepticon is updated with each `clics load`, without
+        changing the fingerprints of the datasets.
+
+        :return: `dict` mapping dataset IDs to digests of the data added from the catalogs.
+        """
+        digests = collections.defaultdict(hashlib.md5)
+        for i, sql in enumerate([
+            "select dataset_ID, ID, glottocode, family, macroarea, latitude, longitude "
+            "from languagetable order by dataset_ID, ID",
+            "select dataset_ID, ID, concepticon_id, concepticon_gloss, ontological_category, "
+            "semantic_field from parametertable order by dataset_ID, ID",
+        ]):
+            for row in self.fetchall(sql):
+                # Each row is digested as JSON array tagged with the table it comes from, so
+                # different distributions of rows over tables cannot result in the same digest.
+                digests[row[0]].update(json.dumps([i] + list(row[1:])).encode('utf8'))
+        return {dsid: digest.hexdigest() for dsid, digest in digests.items()}
+
+    def _delete(self, conn, dataset_id):
+        tables = self.tables
+        for table, cols in tables.items():
+            if table != 'dataset' and 'dataset_ID' in cols:
+                conn.execute("DELETE FROM {0} WHERE dataset_ID = ?".format(table), (dataset_id,))
+        conn.execute("DELETE FROM dataset WHERE ID = ?", (dataset_id,))
+
+    def unload(self, dataset_id, args=None):
+        with self.connection() as conn:
+            self._delete(conn, getattr(dataset_id, 'id', dataset_id))
+            conn.commit()
+
+    def write(self, data):
+        """
+        Write the data of a dataset to the database, replacing any earlier version.
+
+        Removing an earlier version and inserting the new data is done in one transaction.
+
+        :param data: `DatasetData` instance, as returned from `Database.read`.
+        """
+        try:
+            self.fetchone('select ID from dataset')
+        except sqlite3.OperationalError:
+            self.create(force=True)
+
+        # update the DB schema:
+        for t in data.tables:
+            if self._create_table_if_not_exists(t):
+                continue
+            db_cols = self.tables[t.name]
+            for name, db_type in t.columns:
+                if name not in db_cols:
+                    with self.connection() as conn:
+                        conn.execute("ALTER TABLE {0} ADD COLUMN `{1}` {2}".format(
+                            t.name, name, db_type))
+                elif db_cols[name] != db_type:
+                    raise ValueError('column {0}:{1} {2} redefined with new type {3}'.format(
+                        t.name, name, db_cols[name], db_type))
+
+        for t in data.ref_tables:
+            self._create_table_if_not_exists(t)
+
+        self.update_schema()
+
+        with self.connection() as db:
+            db.execute('PRAGMA foreign_keys = ON;')
+            self._delete(db, data.id)
+            insert(
+                db,
+                'dataset',
+                'ID,name,version,metadata_json',
+                (data.id, data.name, data.version, data.metadata_json))
+            insert(db, 'datasetmeta', 'dataset_ID,key,value', *data.properties)
+            insert(
+                db,
+                'SourceTable',
+                ['dataset_ID', 'ID', 'bibtex_type'] + BIBTEX_FIELDS + ['extra'],
+                *data.sources)
+            for t in data.tables:
+                insert(db, t.name, t.keys, *t.rows)
+            for tname, keys, rows in data.refs:
+                insert(db, tname, keys, *rows)
+            insert(
+                db, 'datasetfingerprint', 'dataset_ID,fingerprint', (data.id, data.fingerprint))
+            db.commit()
+
+    def load(self, ds, args=None, verbose=False):
+        self.write(self.read(*dataset_spec(ds, self.clics_form)))
+
+    def load_datasets(self, specs, workers=1):
+        """
+        Load datasets into the database.
+
+        :param specs: `list` of dataset specifications as returned by `dataset_spec`.
+
+        Reading the CLDF data and computing derived columns like `clics_form` is done in \
+        `workers` separate processes, while the data is written to the database from this \
+        process only.
+
+        :return: Generator of the IDs of the datasets, yielded when the data has been written.
+        """
+        specs = [(self.fname, self.clics_form, spec) for spec in specs]
+        if workers <= 1:
+            for spec in specs:
+                data = _read(spec)
+                self.write(data)
+                yield data.id
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # We only read ahead a limited number of datasets, to limit memory consumption.
+            pending, specs = collections.deque(), iter(specs)
+            for spec in itertools.islice(specs, 2 * workers):
+                pending.append(executor.submit(_read, spec))
+            while pending:
+                data = pending.popleft().result()
+                spec = next(specs, None)
+                if spec:
+                    pending.append(executor.submit(_read, spec))
+                self.write(data)
+                yield data.id
+
+    def clics_forms(self, words):
+        """
+        :return: `list` of the CLICS forms of `words` - computed in one batch, if the \
+        `IClicsForm` implementation supports it.
+        """
+        if hasattr(self.clics_form, 'batch'):
+            return self.clics_form.batch(words)
+        return [self.clics_form(word) for word in words]
 
     @property
     def varieties(self):
-        return [Variety(*row) for row in self.fetchall("""\
-select * from (
-select
-    l.id, l.dataset_id, l.name, l.glottocode, l.family, l.macroarea, l.longitude, l.latitude
-from
-    languagetable as l
-where
-    l.glottocode is not null
-    and l.family != 'Bookkeeping'
-group by
-    l.id, l.dataset_id
-order by
-    l.dataset_id, l.id
-)
-where id in (select distinct language_id from formtable);
-    """)]
+        return [Variety(*row) for row in self.fetchall('varieties')]
+
+    def iter_rows(self, sql, params=None):
+        """
+        Stream the result rows of a query, rather than fetching them all at once.
+        """
+        with self.connection() as conn:
+            cu = conn.cursor()
+            cu.execute(self.sql.get(sql, sql), params or ())
+            for row in cu:
+                yield row
 
-    def iter_wordlists(self, varieties):
+    def iter_wordlists(self, varieties, streaming=True):
         """
+        :param streaming: If `True`, all wordlists are read in one ordered scan of the form \
+        table, otherwise one query per variety is run.
         :return: Generator of (wordlist, forms) pairs, where forms are ordered by `clics_form`.
         """
         languages = {(v.source, v.id): v for v in varieties}
-        for (dsid, vid), v in sorted(languages.items()):
-            forms = [Form(*row) for row in self.fetchall("""
-select
-    f.id, f.dataset_id, f.form, f.clics_form,
-    p.name, p.concepticon_id, p.concepticon_gloss, p.ontological_category, p.semantic_field
-from
-    formtable as f, parametertable as p
-where
-    f.parameter_id = p.id
-    and f.dataset_id = p.dataset_id
-    and p.concepticon_id is not null
-    and f.language_id = ?
-    and f.dataset_id = ?
-order by
-    f.clics_form, p.concepticon_id
-""", params=(vid, dsid))]
-            assert forms
-            yield v, forms
+        if not streaming:
+            for (dsid, vid), v in sorted(languages.items()):
+                forms = [
+                    Form(*row[:-2]) for row in self.fetchall('wordlist', params=(vid, dsid))]
+                assert forms
+                yield v, forms
+            return
 
-    def _lids_by_concept(self):
-        return {r[0]: sorted(set(r[1].split())) for r in self.fetchall("""\
-select
-    p.concepticon_id, group_concat(f.dataset_id || '-' || f.language_id, ' ')
-from
-    parametertable as p, formtable as f
-where
-    f.parameter_id = p.id and f.dataset_id = p.dataset_id
-group by
-    p.concepticon_id
-""")}
+        datasets = {dsid for dsid, _ in languages}
+        if len(datasets) == 1:  # No need to scan the forms of other datasets.
+            rows = self.iter_rows('dataset_wordlists', params=tuple(datasets))
+        else:
+            rows = self.iter_rows('wordlists')
+        seen = set()
+        for (dsid, vid), rows in itertools.groupby(rows, lambda r: (r[-2], r[-1])):
+            if (dsid, vid) in languages:
+                seen.add((dsid, vid))
+                yield languages[dsid, vid], [Form(*row[:-2]) for row in rows]
+        assert len(seen) == len(languages)
 
-    def _fids_by_concept(self):
-        return {r[0]: sorted(set(r[1].split('|') if r[1] else '')) for r in self.fetchall("""\
-select
-    p.concepticon_id, group_concat(l.family, '|')
-from
-    parametertable as p, formtable as f, languagetable as l
-where
-    f.parameter_id = p.id
-    and f.dataset_id = p.dataset_id
-    and f.language_id = l.id
-    and f.dataset_id = l.dataset_id
-group by
-    p.concepticon_id
-""")}
+    def concept_data(self, dataset):
+        """
+        :return: `OrderedDict` mapping Concepticon IDs to the data of a dataset about the concept, \
+        to be merged with `merge_concept_data`.
+        """
+        return collections.OrderedDict(
+            _iter_concept_data(self.iter_rows('dataset_concept_forms', params=(dataset,))))
 
-    def _wids_by_concept(self):
-        return {r[0]: sorted(set(r[1].split())) for r in self.fetchall("""\
-select
-    p.concepticon_id, group_concat(f.dataset_id || '-' || f.id, ' ')
-from
-    parametertable as p, formtable as f
-where
-    f.parameter_id = p.id and f.dataset_id = p.dataset_id
-group by
-    p.concepticon_id
-""")}
+    def iter_concepts(self, data=None):
+        """
+        :param data: Concept data as returned by `merge_concept_data` to use instead of querying \
+        the db.
+        :return: Generator of `Concept` instances, ordered by Concepticon ID.
+        """
+        data = data.items() if data is not None else _iter_concept_data(
+            self.iter_rows('concept_forms'))
+        for _, (metadata, varieties, families, forms) in data:
+            for md in metadata:
+                yield Concept(
+                    *md,
+                    varieties=sorted(varieties),
+                    families=sorted(families),
+                    forms=sorted(forms))
 
-    def iter_concepts(self):
-        concepts = [Concept(*row) for row in self.fetchall("""\
-select distinct
-    concepticon_id, concepticon_gloss, ontological_category, semantic_field
-from
-    parametertable
-where
-    concepticon_id is not null""")]
-        lids = self._lids_by_concept()
-        fids = self._fids_by_concept()
-        wids = self._wids_by_concept()
-
-        for c in concepts:
-            c.varieties = lids.get(c.id, [])
-            c.families = fids.get(c.id, [])
-            c.forms = wids.get(c.id, [])
-            yield c
+
+def _iter_concept_data(rows):
+    """
+    :return: Generator of (Concepticon ID, [metadata, varieties, families, forms]) pairs.
+    """
+    for cid, rows in itertools.groupby(rows, lambda r: r[0]):
+        metadata, varieties, families, forms = [], set(), set(), set()
+        for row in rows:
+            if row[:4] not in metadata:
+                metadata.append(row[:4])
+            if row[6] is not None:  # Not a concept without any forms.
+                varieties.add(row[4])
+                forms.add(row[6])
+                if row[5] is not None:
+                    families.add(row[5])
+        yield cid, [metadata, varieties, families, forms]
+
+
+def merge_concept_data(data):
+    """
+    :param data: Iterable of concept data as returned by `Database.concept_data`, ordered by \
+    dataset ID.
+    :return: `OrderedDict` of the merged data, ordered by Concepticon ID.
+    """
+    res = {}
+    for d in data:
+        for cid, (metadata, varieties, families, forms) in d.items():
+            md, v, fam, f = res.setdefault(cid, [[], set(), set(), set()])
+            md.extend(m for m in metadata if m not in md)
+            v.update(varieties)
+            fam.update(families)
+            f.update(forms)
+    return collections.OrderedDict(sorted(res.items()))
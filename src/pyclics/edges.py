@@ -0,0 +1,265 @@
+"""
+Compact accumulation of the edges of a colexification network.
+
+Colexifications are accumulated on integer IDs for concepts, varieties, families and forms,
+and the `networkx.Graph` with its string-valued attributes is only built for the edges which
+pass the edge filter.
+"""
+import array
+import collections
+
+import numpy as np
+from scipy import sparse
+
+__all__ = ['EdgeAccumulator', 'passes_filter']
+
+
+def clean(word):
+    return "".join([w for w in word if w not in '/,;"'])
+
+
+def passes_filter(weights, threshold, edgefilter):
+    """
+    :param weights: Triple (FamilyWeight, LanguageWeight, WordWeight) of an edge.
+    :return: Boolean flag signaling whether the edge passes the filter.
+    """
+    index = {'families': 0, 'languages': 1, 'words': 2}.get(edgefilter)
+    return index is None or weights[index] >= threshold
+
+
+class Index(dict):
+    """
+    Maps hashable keys to consecutive integer IDs, keeping data associated with each key.
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.keys_, self.data = [], []
+
+    def add(self, key, data=None):
+        res = self.get(key)
+        if res is None:
+            res = self[key] = len(self.keys_)
+            self.keys_.append(key)
+            self.data.append(data)
+        return res
+
+
+class Edge(object):
+    """
+    The colexifications of a concept pair, with forms, varieties and families as integer IDs.
+    """
+    __slots__ = ['words', 'languages', 'families', 'wofam']
+
+    def __init__(self):
+        self.words = set()  # pairs of form IDs
+        self.languages = set()
+        self.families = set()
+        # Flat array of (form A, form B, variety) triples - for each colexification:
+        self.wofam = array.array('l')
+
+    @property
+    def weights(self):
+        return len(self.families), len(self.languages), len(self.words)
+
+
+class EdgeAccumulator(object):
+    def __init__(self):
+        self.concepts = Index()
+        self.varieties = Index()  # associated data: family ID
+        self.families = Index()
+        self.forms = Index()  # associated data: (clics_form, cleaned form)
+        # Edges keyed by ordered pairs of concept IDs, in order of creation:
+        self.edges = collections.OrderedDict()
+
+    def add(self, variety, formA, formB):
+        a = self.concepts.add(formA.concepticon_id)
+        b = self.concepts.add(formB.concepticon_id)
+        key = (a, b) if a < b else (b, a)
+        edge = self.edges.get(key)
+        if edge is None:
+            edge = self.edges[key] = Edge()
+
+        fa = self.forms.add(formA.gid, (formA.clics_form, clean(formA.form)))
+        fb = self.forms.add(formB.gid, (formB.clics_form, clean(formB.form)))
+        family = self.families.add(variety.family)
+        v = self.varieties.add(variety.gid, family)
+        edge.words.add((fa, fb))
+        edge.languages.add(v)
+        edge.families.add(family)
+        edge.wofam.extend((fa, fb, v))
+
+    def update(self, colexifications):
+        """
+        :param colexifications: Iterable of (variety, formA, formB) triples.
+        """
+        for v, formA, formB in colexifications:
+            self.add(v, formA, formB)
+        return self
+
+    def merge(self, other):
+        """
+        Add the edges accumulated in another `EdgeAccumulator`.
+
+        Merging accumulators computed for consecutive chunks of colexifications yields the same \
+        result as accumulating all colexifications in one accumulator.
+        """
+        concepts = [self.concepts.add(key) for key in other.concepts.keys_]
+        families = [self.families.add(key) for key in other.families.keys_]
+        varieties = [
+            self.varieties.add(key, families[family])
+            for key, family in zip(other.varieties.keys_, other.varieties.data)]
+        forms = [
+            self.forms.add(key, data) for key, data in zip(other.forms.keys_, other.forms.data)]
+
+        for (a, b), edge in other.edges.items():
+            a, b = concepts[a], concepts[b]
+            key = (a, b) if a < b else (b, a)
+            target = self.edges.get(key)
+            if target is None:
+                target = self.edges[key] = Edge()
+            target.words.update((forms[fa], forms[fb]) for fa, fb in edge.words)
+            target.languages.update(varieties[v] for v in edge.languages)
+            target.families.update(families[f] for f in edge.families)
+            for i in range(0, len(edge.wofam), 3):
+                fa, fb, v = edge.wofam[i:i + 3]
+                target.wofam.extend((forms[fa], forms[fb], varieties[v]))
+        return self
+
+    def __len__(self):
+        return len(self.edges)
+
+    def iter_edges(self, nodes=None):
+        """
+        :param nodes: Optional sequence of concept IDs. If passed, edges are yielded in the order \
+        in which `networkx.Graph.edges` would report them for a graph with nodes added in this \
+        order and edges added in order of creation.
+        :return: Generator of (concept A, concept B, `Edge`) triples - in order of creation, \
+        unless `nodes` is passed.
+        """
+        keys = self.concepts.keys_
+        if nodes is None:
+            for (a, b), edge in self.edges.items():
+                yield keys[a], keys[b], edge
+            return
+
+        position = {self.concepts[n]: i for i, n in enumerate(nodes) if n in self.concepts}
+        adjacency = collections.defaultdict(list)
+        for a, b in self.edges:
+            adjacency[a].append(b)
+            adjacency[b].append(a)
+        for a in sorted(adjacency, key=lambda c: position.get(c, len(position) + c)):
+            pa = position.get(a, len(position) + a)
+            for b in adjacency[a]:
+                if position.get(b, len(position) + b) > pa:
+                    yield keys[a], keys[b], self.edges[(a, b) if a < b else (b, a)]
+
+    def languages(self, edge):
+        return {self.varieties.keys_[v] for v in edge.languages}
+
+    def edge_attrs(self, edge):
+        """
+        :return: `OrderedDict` of the attributes of the edge in the colexification network.
+        """
+        forms, varieties, families = self.forms, self.varieties, self.families
+
+        def wofam(fa, fb, v):
+            return '/'.join([
+                forms.keys_[fa],
+                forms.keys_[fb],
+                forms.data[fa][0],
+                varieties.keys_[v],
+                families.keys_[varieties.data[v]],
+                forms.data[fa][1],
+                forms.data[fb][1],
+            ])
+
+        return collections.OrderedDict([
+            ('words', ';'.join(sorted(
+                '{0}/{1}'.format(forms.keys_[fa], forms.keys_[fb]) for fa, fb in edge.words))),
+            ('languages', ';'.join(sorted(varieties.keys_[v] for v in edge.languages))),
+            ('families', ';'.join(sorted(families.keys_[f] for f in edge.families))),
+            ('wofam', ';'.join(
+                wofam(*edge.wofam[i:i + 3]) for i in range(0, len(edge.wofam), 3))),
+            ('WordWeight', len(edge.words)),
+            ('FamilyWeight', len(edge.families)),
+            ('LanguageWeight', len(edge.languages)),
+        ])
+
+    def add_to_graph(self, graph, threshold, edgefilter):
+        """
+        Add the edges passing the filter to a graph.
+
+        :return: The number of edges which have been ignored.
+        """
+        ignored = 0
+        for conceptA, conceptB, edge in self.iter_edges():
+            if passes_filter(edge.weights, threshold, edgefilter):
+                graph.add_edge(conceptA, conceptB, **self.edge_attrs(edge))
+            else:
+                ignored += 1
+        return ignored
+
+    def language_stats(self, inventories, threshold, edgefilter):
+        """
+        Compute colexification statistics per variety.
+
+        A colexification of two concepts is possible in a variety, if the variety has forms for
+        both concepts, i.e. if both concepts are in its inventory.
+
+        :param inventories: `dict` mapping variety IDs to sets of Concepticon IDs.
+        :return: `dict` mapping variety IDs to quadruples (number of colexifications, number of \
+        possible colexifications, number of colexifications passing the edge filter, number of \
+        possible colexifications passing the edge filter).
+        """
+        keys = [key for key, edge in self.edges.items() if edge.languages]
+        passing = np.array(
+            [passes_filter(self.edges[key].weights, threshold, edgefilter) for key in keys],
+            dtype=bool)
+
+        # Inverted index, mapping varieties to the indices of the edges they take part in:
+        edges_by_variety = collections.defaultdict(list)
+        for i, key in enumerate(keys):
+            for v in self.edges[key].languages:
+                edges_by_variety[v].append(i)
+
+        # Sparse concept incidence matrix, with one row per variety:
+        varieties = list(inventories)
+        inventory = [
+            np.array(
+                [self.concepts[cid] for cid in inventories[variety] if cid in self.concepts],
+                dtype=int)
+            for variety in varieties]
+        incidence = sparse.csr_matrix(
+            (
+                np.ones(sum(len(cids) for cids in inventory)),
+                np.concatenate(inventory) if inventory else np.array([], dtype=int),
+                np.cumsum([0] + [len(cids) for cids in inventory]),
+            ),
+            shape=(len(varieties), len(self.concepts)))
+
+        a, b = np.array([key[0] for key in keys], dtype=int), np.array(
+            [key[1] for key in keys], dtype=int)
+
+        def possible(mask):
+            # Number of edges selected by mask with both concepts in the inventory of a variety:
+            adjacency = sparse.csr_matrix(
+                (np.ones(mask.sum()), (a[mask], b[mask])),
+                shape=(len(self.concepts), len(self.concepts)))
+            counts = (incidence @ adjacency).multiply(incidence).sum(axis=1)
+            return np.rint(np.asarray(counts).ravel()).astype(int)
+
+        possible_all = possible(np.ones(len(keys), dtype=bool))
+        possible_threshold = possible(passing)
+
+        res = {}
+        for i, variety in enumerate(varieties):
+            edges = np.array(edges_by_variety.get(self.varieties.get(variety), []), dtype=int)
+            # Colexified edges for which the inventory is incomplete count as possible, too:
+            incomplete = ~(np.isin(a[edges], inventory[i]) & np.isin(b[edges], inventory[i]))
+            res[variety] = (
+                len(edges),
+                int(possible_all[i] + incomplete.sum()),
+                int(passing[edges].sum()),
+                int(possible_threshold[i] + (incomplete & passing[edges]).sum()),
+            )
+        return res
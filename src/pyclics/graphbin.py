@@ -0,0 +1,214 @@
+"""
+A compact binary storage format for colexification networks.
+
+A file consists of
+- the magic bytes `MAGIC`,
+- the length of the JSON header as little-endian 8 byte integer,
+- the JSON header, describing the graph and the layout of the arrays,
+- the arrays, aligned at 8 bytes.
+
+Nodes and edges are stored in integer tables: node keys and string-valued attributes as indices
+into a string pool (with -1 signaling a missing value), numeric attributes as numpy arrays with
+a mask for missing values; attributes with values of mixed types as JSON strings in the pool.
+Since all data is stored in arrays, a file can be memory-mapped and read without parsing.
+"""
+import os
+import json
+import pathlib
+import collections
+
+import numpy as np
+import networkx as nx
+
+__all__ = ['BinaryGraph']
+
+MAGIC = b'CLICSGR1'
+ALIGN = 8
+KINDS = collections.OrderedDict([
+    ('str', np.int32), ('int', np.int64), ('float', np.float64), ('json', np.int32)])
+INT64 = np.iinfo(np.int64)
+
+
+class StringPool(dict):
+    def __init__(self):
+        dict.__init__(self)
+        self.strings = []
+
+    def add(self, s):
+        res = self.get(s)
+        if res is None:
+            res = self[s] = len(self.strings)
+            self.strings.append(s)
+        return res
+
+
+def _attr_names(items):
+    res = collections.OrderedDict()
+    for attrs in items:
+        for k in attrs:
+            res[k] = None
+    return list(res)
+
+
+def _kind(values):
+    types = {type(v) for v in values if v is not None}
+    if types <= {bool, int}:
+        if all(INT64.min <= v <= INT64.max for v in values if v is not None):
+            return 'int'
+    elif types <= {bool, int, float}:
+        return 'float'
+    elif types == {str}:
+        return 'str'
+    # Mixed types - which GML accepts - and integers out of range are stored as JSON:
+    return 'json'
+
+
+def _columns(prefix, items, pool, exclude=()):
+    """
+    :return: Generator of (name, kind, array name, array) for the attributes of nodes or edges.
+    """
+    items = list(items)
+    for i, name in enumerate(n for n in _attr_names(items) if n not in exclude):
+        # Like in GML, list and set values are stored as strings with // as separator.
+        values = [
+            '//'.join([str(x) for x in v]) if isinstance(v, (list, set)) else v
+            for v in (attrs.get(name) for attrs in items)]
+        kind = _kind(values)
+        if kind in ['str', 'json']:
+            if kind == 'json':
+                values = [None if v is None else json.dumps(v) for v in values]
+            array = np.array([-1 if v is None else pool.add(v) for v in values], dtype=np.int32)
+            yield name, kind, '{0}.{1}'.format(prefix, i), array
+        else:
+            array = np.array([0 if v is None else v for v in values], dtype=KINDS[kind])
+            yield name, kind, '{0}.{1}'.format(prefix, i), array
+            if any(v is None for v in values):
+                yield name, 'mask', '{0}.{1}.mask'.format(prefix, i), np.array(
+                    [v is not None for v in values], dtype=np.uint8)
+
+
+class BinaryGraph(object):
+    """
+    Read access to a graph stored in the binary format.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(str(path), dtype=np.uint8, mode='r')
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError('{0} is not a binary graph file'.format(path))
+        size = int(self._data[len(MAGIC):len(MAGIC) + 8].view('<u8')[0])
+        start = len(MAGIC) + 8
+        self.header = json.loads(bytes(self._data[start:start + size]).decode('utf8'))
+        self._start = start + size
+
+    def array(self, name):
+        """
+        :return: Memory-mapped `numpy.ndarray`.
+        """
+        offset, dtype, length = self.header['arrays'][name]
+        dtype, offset = np.dtype(dtype), self._start + offset
+        return self._data[offset:offset + length * dtype.itemsize].view(dtype)
+
+    @property
+    def strings(self):
+        offsets, data = self.array('strings.offsets').tolist(), bytes(self.array('strings.data'))
+        return [data[offsets[i]:offsets[i + 1]].decode('utf8') for i in range(len(offsets) - 1)]
+
+    def _items(self, strings, kind):
+        """
+        :return: `list` of attribute dicts for all nodes or edges.
+        """
+        columns = collections.OrderedDict()
+        for name, kind_, array in self.header[kind]:
+            if kind_ == 'mask':
+                columns[name][1] = self.array(array).tolist()
+            else:
+                values = self.array(array).tolist()
+                if kind_ == 'str':
+                    columns[name] = [[None if i < 0 else strings[i] for i in values], None]
+                elif kind_ == 'json':
+                    columns[name] = [
+                        [None if i < 0 else json.loads(strings[i]) for i in values], None]
+                else:
+                    columns[name] = [values, None]
+
+        res = [{} for _ in range(self.header['counts'][kind])]
+        for name, (values, mask) in columns.items():
+            for i, (attrs, value) in enumerate(zip(res, values)):
+                if value is not None and (mask is None or mask[i]):
+                    attrs[name] = value
+        return res
+
+    def to_networkx(self):
+        strings = self.strings
+        graph = nx.DiGraph() if self.header['directed'] else nx.Graph()
+        graph.graph.update(self.header['graph'])
+        keys = [strings[i] for i in self.array('nodes.key').tolist()]
+        graph.add_nodes_from(zip(keys, self._items(strings, 'nodes')))
+        graph.add_edges_from(
+            (keys[u], keys[v], attrs) for u, v, attrs in zip(
+                self.array('edges.source').tolist(),
+                self.array('edges.target').tolist(),
+                self._items(strings, 'edges')))
+        return graph
+
+    @staticmethod
+    def write(graph, path, exclude=()):
+        """
+        Write a graph to a file in the binary format.
+
+        Like in GML, node keys are stored as strings. Attribute values are stored as strings, \
+        integers or floats - or as JSON, if the values of an attribute have mixed types.
+
+        :param exclude: Names of node and edge attributes which should not be written.
+        """
+        if graph.is_multigraph():
+            raise ValueError('Multigraphs are not supported')
+        pool = StringPool()
+        nodes = list(graph.nodes)
+        index = {n: i for i, n in enumerate(nodes)}
+        edges = list(graph.edges(data=True))
+        arrays, header = collections.OrderedDict(), dict(
+            directed=graph.is_directed(),
+            graph=graph.graph,
+            counts=dict(nodes=len(nodes), edges=len(edges)),
+            nodes=[],
+            edges=[],
+            arrays=collections.OrderedDict(),
+        )
+        arrays['nodes.key'] = np.array([pool.add(str(n)) for n in nodes], dtype=np.int32)
+        arrays['edges.source'] = np.array([index[u] for u, _, _ in edges], dtype=np.int32)
+        arrays['edges.target'] = np.array([index[v] for _, v, _ in edges], dtype=np.int32)
+        for kind, items in [
+            ('nodes', (graph.nodes[n] for n in nodes)),
+            ('edges', (attrs for _, _, attrs in edges)),
+        ]:
+            for name, kind_, array_name, array in _columns(kind, items, pool, exclude):
+                header[kind].append([name, kind_, array_name])
+                arrays[array_name] = array
+
+        data = [s.encode('utf8') for s in pool.strings]
+        arrays['strings.offsets'] = np.cumsum([0] + [len(s) for s in data], dtype=np.int64)
+        arrays['strings.data'] = np.frombuffer(b''.join(data), dtype=np.uint8)
+
+        # Array offsets are relative to the start of the data, i.e. the end of the padded header.
+        offset = 0
+        for name, array in arrays.items():
+            offset += -offset % ALIGN
+            header['arrays'][name] = [offset, array.dtype.newbyteorder('<').str, len(array)]
+            offset += array.nbytes
+        header = json.dumps(header).encode('utf8')
+        header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+
+        # We write to a temporary file first, to not truncate a file which may be memory-mapped.
+        tmp = pathlib.Path(str(path) + '.tmp')
+        with tmp.open('wb') as fp:
+            fp.write(MAGIC)
+            fp.write(np.array([len(header)], dtype='<u8').tobytes())
+            fp.write(header)
+            start = fp.tell()
+            for array in arrays.values():
+                fp.write(b'\x00' * (-(fp.tell() - start) % ALIGN))
+                fp.write(array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes())
+        os.replace(str(tmp), str(path))
+        return path
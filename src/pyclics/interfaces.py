@@ -2,6 +2,10 @@ from zope.interface import Interface
 
 
 class IClicsForm(Interface):
+    """
+    Implementations may provide a method `batch`, computing the values for a `list` of forms at \
+    once, which is then used when loading data.
+    """
     def __call__(self, form):
         """
         :param form: a `pyclics.models.Form` instance.
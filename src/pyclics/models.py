@@ -1,10 +1,12 @@
 from collections import OrderedDict
-import html
 from pathlib import Path
 
 import attr
 import geojson
-import networkx as nx
+
+from pyclics.graphbin import BinaryGraph
+from pyclics.sidecar import AttributeStore
+from pyclics.util import write_gml, read_gml
 
 __all__ = ['Form', 'Concept', 'Variety', 'Network']
 
@@ -97,19 +99,29 @@ class Network(object):
     threshold = attr.ib()
     edgefilter = attr.ib()
     graphdir = attr.ib(converter=lambda s: Path(str(s)))
+    # GML is the format for export, the binary format is faster to read and write.
+    format = attr.ib(default='gml', validator=attr.validators.in_(['gml', 'gml.gz', 'bin']))
 
     @property
     def fname(self):
-        return self.graphdir / '{0.graphname}-{0.threshold}-{0.edgefilter}.gml'.format(self)
+        return self.graphdir / '{0.graphname}-{0.threshold}-{0.edgefilter}.{0.format}'.format(
+            self)
 
-    def save(self, graph):
-        with self.fname.open('w') as fp:
-            fp.write('\n'.join(html.unescape(line) for line in nx.generate_gml(graph)))
-        return self.fname
+    @property
+    def sidecar(self):
+        return AttributeStore(
+            self.graphdir / '{0.graphname}-{0.threshold}-{0.edgefilter}.sqlite'.format(self))
+
+    def save(self, graph, exclude=()):
+        """
+        :param exclude: Names of node and edge attributes which should not be saved.
+        """
+        if self.format == 'bin':
+            return BinaryGraph.write(graph, self.fname, exclude=exclude)
+        return write_gml(graph, self.fname, exclude=exclude)
 
     @property
     def graph(self):
-        def lines():
-            for line in self.fname.open():
-                yield line.encode('ascii', 'xmlcharrefreplace').decode('utf-8')
-        return nx.parse_gml(''.join(lines()))
+        if self.format == 'bin':
+            return BinaryGraph(self.fname).to_networkx()
+        return read_gml(self.fname)
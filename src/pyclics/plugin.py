@@ -2,12 +2,15 @@
 Pluggable functionality for CLICS
 """
 import itertools
+import functools
 import string
 
 from unidecode import unidecode
 from tqdm import tqdm
 
-from pyclics.util import networkx2igraph, iter_subgraphs
+from pyclics.util import (
+    networkx2igraph, ego_networks, adjacency_bitsets, bitset_members, bitset_size, to_bitset,
+)
 
 #
 # Computation of the CLICS form of a lexeme:
@@ -16,9 +19,69 @@ from pyclics.util import networkx2igraph, iter_subgraphs
 ALLOWED_CHARACTERS = string.ascii_letters + string.digits + '@'
 
 
-def clics_form(word):
-    if word:
-        return ''.join(c for c in unidecode(word) if c in ALLOWED_CHARACTERS).lower()
+class TranslationTable(dict):
+    """
+    Translation table for `str.translate`, mapping code points to their contribution to the \
+    CLICS form.
+
+    Since `unidecode` transliterates each character independently, the CLICS form of a word is \
+    the concatenation of the CLICS forms of its characters. These are computed when a code \
+    point is first looked up.
+    """
+    def __missing__(self, cp):
+        res = self[cp] = ''.join(
+            c for c in unidecode(chr(cp)) if c in ALLOWED_CHARACTERS).lower()
+        return res
+
+
+TRANSLATION_TABLE = TranslationTable()
+# A separator to join words with, to transliterate a list of words in one go:
+SEPARATOR = '\x00'
+BATCH_TRANSLATION_TABLE = TranslationTable({ord(SEPARATOR): SEPARATOR})
+
+
+class ClicsForm(object):
+    """
+    Computes the CLICS form of a word, i.e. the lowercase ASCII transliteration of the word with \
+    everything but letters, digits and "@" stripped.
+
+    Since forms repeat heavily across datasets, the CLICS forms of the most recently seen \
+    `maxsize` distinct words are cached.
+    """
+    def __init__(self, maxsize=2 ** 16):
+        self.maxsize = maxsize
+        self._clics_form = functools.lru_cache(maxsize=maxsize)(self._translate)
+
+    def __getstate__(self):
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @staticmethod
+    def _translate(word):
+        return word.translate(TRANSLATION_TABLE)
+
+    def __call__(self, word):
+        if word:
+            return self._clics_form(word)
+
+    def batch(self, words):
+        """
+        Compute the CLICS forms for a column of words in one call of `str.translate`.
+
+        :param words: Iterable of words.
+        :return: `list` of CLICS forms.
+        """
+        words = list(words)
+        forms = SEPARATOR.join(w or '' for w in words).translate(BATCH_TRANSLATION_TABLE)
+        forms = forms.split(SEPARATOR)
+        if len(forms) != len(words):  # Some word contained the separator.
+            return [self(w) for w in words]
+        return [f if w else None for w, f in zip(words, forms)]
+
+
+clics_form = ClicsForm()
 
 
 #
@@ -58,21 +121,37 @@ def full_colexification(forms):
 # Cluster algorithms:
 #
 def subgraph(graph, kw):
-    all_nodes = {n for n in graph.nodes}
-    all_edges = {tuple(sorted(e, key=lambda i: int(i))) for e in graph.edges()}
-    subgraphs = [sg for _, sg in iter_subgraphs(graph)]
+    nodes, adjacency = adjacency_bitsets(graph)
+    subgraphs = ego_networks(
+        graph,
+        max_distance=kw.get('max_distance') or 2,
+        max_nodes_pre=kw.get('max_nodes_pre') or 30,
+        max_nodes_post=kw.get('max_nodes_post') or 50,
+        workers=int(kw.get('workers') or 1))
+
+    # Coverage is tracked with bitsets: nodes not yet included in a subgraph, and per node, the
+    # neighbors it shares an edge with which is not yet included in a subgraph.
+    uncovered_nodes = (1 << len(nodes)) - 1
+    uncovered_edges = list(adjacency)
+    pending = to_bitset(i for i, bitset in enumerate(uncovered_edges) if bitset)
 
     # Iterate over subgraphs by descending number of nodes:
-    for sg in sorted(subgraphs, key=lambda i: len(i), reverse=True):
-        if (not all_nodes) and (not all_edges):
+    for i in sorted(range(len(subgraphs)), key=lambda i: bitset_size(subgraphs[i]), reverse=True):
+        if (not uncovered_nodes) and (not pending):
             # all nodes and edges are included in at least one subgraph
             break  # pragma: no cover
-        all_nodes -= set(sg)
-        all_edges -= set(itertools.combinations(sorted(sg, key=lambda i: int(i)), 2))
-        yield sg
+        sg = subgraphs[i]
+        uncovered_nodes &= ~sg
+        for n in bitset_members(sg & pending):
+            # Self-loops are not covered by subgraphs:
+            uncovered_edges[n] &= ~sg | (1 << n)
+            if not uncovered_edges[n]:
+                pending ^= 1 << n
+        yield [nodes[n] for n in bitset_members(sg)]
     else:
-        if all_nodes:  # pragma: no cover
-            raise ValueError('unclustered nodes: {0}'.format(all_nodes))
+        if uncovered_nodes:  # pragma: no cover
+            raise ValueError('unclustered nodes: {0}'.format(
+                {nodes[n] for n in bitset_members(uncovered_nodes)}))
 
 
 def infomap(graph, kw):
@@ -92,7 +171,11 @@ def infomap(graph, kw):
         vertex_weights = None
         edge_weights = 'weight'
 
-    graph = networkx2igraph(_graph)
+    # We only copy the attributes needed for clustering:
+    graph = networkx2igraph(
+        _graph,
+        node_attrs=['ConcepticonId'] + ([vertex_weights] if vertex_weights else []),
+        edge_attrs=[edge_weights])
 
     comps = graph.community_infomap(
         edge_weights=str(edge_weights), vertex_weights=vertex_weights)
@@ -0,0 +1,137 @@
+"""
+Sidecar storage for the bulky attributes of networks.
+
+The joined lists of forms, varieties and families attached to nodes and edges of a colexification
+network make up most of its size, but are only needed when exporting data for the app. Thus, they
+can be stored in a SQLite db next to the network files and fetched on demand.
+"""
+import os
+import sqlite3
+import pathlib
+import itertools
+import contextlib
+
+__all__ = ['NODE_ATTRS', 'EDGE_ATTRS', 'AttributeStore']
+
+NODE_ATTRS = ['Words', 'Languages', 'Families']
+EDGE_ATTRS = ['words', 'languages', 'families', 'wofam']
+# Maximal number of keys in a query - limited by SQLite's maximal number of variables.
+BATCH_SIZE = 400
+
+
+def _edge_key(u, v):
+    u, v = str(u), str(v)
+    return (u, v) if u <= v else (v, u)
+
+
+class AttributeStore(object):
+    """
+    Node and edge attributes of a network, stored in a SQLite db.
+    """
+    def __init__(self, path):
+        self.path = pathlib.Path(str(path))
+
+    def exists(self):
+        return self.path.exists()
+
+    def connection(self):
+        return contextlib.closing(sqlite3.connect(self.path.as_posix()))
+
+    def write(self, graph, source=None):
+        """
+        Write the bulky attributes of the nodes and edges of `graph`.
+
+        :param source: `AttributeStore` to read the attribute values from, rather than `graph`, \
+        e.g. to store the attributes for a graph derived from the network stored in `source`.
+        """
+        def node_rows():
+            items = graph.nodes(data=True)
+            for batch in _batches(items):
+                attrs = source.nodes([n for n, _ in batch]) if source else {}
+                for n, data in batch:
+                    for name, value in (attrs.get(str(n), {}) if source else data).items():
+                        if name in NODE_ATTRS:
+                            yield str(n), name, value
+
+        def edge_rows():
+            items = graph.edges(data=True)
+            for batch in _batches(items):
+                attrs = source.edges([(u, v) for u, v, _ in batch]) if source else {}
+                for u, v, data in batch:
+                    key = _edge_key(u, v)
+                    for name, value in (attrs.get(key, {}) if source else data).items():
+                        if name in EDGE_ATTRS:
+                            yield key + (name, value)
+
+        # We write to a temporary file first, replacing the sidecar when done.
+        tmp = self.path.parent / (self.path.name + '.tmp')
+        if tmp.exists():
+            tmp.unlink()
+        with contextlib.closing(sqlite3.connect(tmp.as_posix())) as conn:
+            conn.execute("""\
+CREATE TABLE node (id TEXT, name TEXT, value TEXT, PRIMARY KEY (id, name)) WITHOUT ROWID""")
+            conn.execute("""\
+CREATE TABLE edge (
+    source TEXT, target TEXT, name TEXT, value TEXT, PRIMARY KEY (source, target, name)
+) WITHOUT ROWID""")
+            conn.executemany("INSERT INTO node VALUES (?, ?, ?)", node_rows())
+            conn.executemany("INSERT INTO edge VALUES (?, ?, ?, ?)", edge_rows())
+            conn.commit()
+        os.replace(tmp.as_posix(), self.path.as_posix())
+        return self.path
+
+    def nodes(self, nodes):
+        """
+        :return: `dict` mapping node IDs (as `str`) to `dict`s of attributes.
+        """
+        res = {}
+        with self.connection() as conn:
+            for batch in _batches([str(n) for n in nodes]):
+                for id_, name, value in conn.execute(
+                        "SELECT id, name, value FROM node WHERE id IN ({0})".format(
+                            ','.join('?' * len(batch))),
+                        batch):
+                    res.setdefault(id_, {})[name] = value
+        return res
+
+    def edges(self, edges):
+        """
+        :return: `dict` mapping pairs of node IDs (as `str`, ordered) to `dict`s of attributes.
+        """
+        res = {}
+        with self.connection() as conn:
+            for batch in _batches(sorted(set(_edge_key(u, v) for u, v in edges))):
+                # We select the edges of the source nodes in the batch and filter in Python:
+                keys = set(batch)
+                sources = sorted(set(u for u, _ in batch))
+                for source, target, name, value in conn.execute(
+                        "SELECT source, target, name, value FROM edge WHERE source IN ({0})".format(
+                            ','.join('?' * len(sources))),
+                        sources):
+                    if (source, target) in keys:
+                        res.setdefault((source, target), {})[name] = value
+        return res
+
+    def enrich_adjacency_data(self, data):
+        """
+        Add the attributes to graph data in the format of `networkx.json_graph.adjacency_data`.
+        """
+        ids = [n['id'] for n in data['nodes']]
+        nodes = self.nodes(ids)
+        for n in data['nodes']:
+            n.update(nodes.get(str(n['id']), {}))
+        edges = self.edges(
+            (u, nbr['id']) for u, nbrs in zip(ids, data['adjacency']) for nbr in nbrs)
+        for u, nbrs in zip(ids, data['adjacency']):
+            for nbr in nbrs:
+                nbr.update(edges.get(_edge_key(u, nbr['id']), {}))
+        return data
+
+
+def _batches(items, size=BATCH_SIZE):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            break
+        yield batch
@@ -1,4 +1,10 @@
+import re
+import gzip
+import hashlib
+import pathlib
 import argparse
+import collections
+import multiprocessing
 from collections import defaultdict
 
 from cldfcatalog import Config
@@ -7,32 +13,158 @@ import igraph
 import networkx as nx
 import html
 
-__all__ = ['networkx2igraph', 'get_communities', 'parse_kwargs']
+__all__ = [
+    'write_gml', 'read_gml', 'networkx2igraph', 'get_communities', 'parse_kwargs',
+    'implementation_name', 'iter_subgraphs', 'ego_networks']
 
 CATALOGS = {'glottolog': Glottolog, 'concepticon': Concepticon}
 
+# Process-wide LRU cache of computed ego-networks, mapping (graph fingerprint, max_distance,
+# max_nodes_pre, max_nodes_post) to lists of bitsets:
+EGO_NETWORK_CACHE = collections.OrderedDict()
+EGO_NETWORK_CACHE_SIZE = 4
 
-def write_gml(graph, path):
+GML_KEY = re.compile('^[A-Za-z][0-9A-Za-z_]*$')
+
+
+def _gml_escape(text):
+    """
+    Use XML character references for non-printable and non-ASCII characters, double quotes and
+    ampersands - as done by `networkx.generate_gml`.
     """
-    Write a graph to GML format (using unicode).
+    return re.sub('[^ -~]|[&"]', lambda m: '&#{0};'.format(ord(m.group(0))), text)
+
+
+def _gml_number(value):
+    if isinstance(value, int):
+        return str(int(value))  # Booleans are written as 0 or 1.
+    text = repr(value).upper()
+    if text == 'INF':
+        return '+INF'
+    # A GML real literal must contain a decimal point:
+    epos = text.rfind('E')
+    if epos != -1 and text.find('.', 0, epos) == -1:
+        text = text[:epos] + '.' + text[epos:]
+    return text
+
 
-    The graph will be adjusted in such a way that all list and set values in edge and
-    node attributes will be represented in the form of a string with // as separator.
+def _gml_lines(key, value, indent):
     """
-    # modify graph TODO
-    ng = graph.copy()
-    for node, data in ng.nodes(data=True):
-        for k, v in data.items():
-            if isinstance(v, (list, set)):
-                data[k] = '//'.join([str(x) for x in v])
-    for nA, nB, data in ng.edges(data=True):
+    Generate the GML lines for one attribute, with list and set values written as strings with
+    // as separator.
+    """
+    if not (isinstance(key, str) and GML_KEY.match(key)):
+        raise ValueError('{0!r} is not a valid GML key'.format(key))
+    if isinstance(value, (list, set)):
+        value = '//'.join([str(x) for x in value])
+    if isinstance(value, (int, float)):
+        if key == 'label':
+            text = str(value) if isinstance(value, int) else _gml_number(value)
+            yield '{0}{1} "{2}"'.format(indent, key, text)
+        elif isinstance(value, int) and not -2 ** 31 <= value < 2 ** 31:
+            # GML only supports signed 32-bit integers.
+            yield '{0}{1} "{2}"'.format(indent, key, value)
+        else:
+            yield '{0}{1} {2}'.format(indent, key, _gml_number(value))
+    elif isinstance(value, dict):
+        yield '{0}{1} ['.format(indent, key)
+        for k, v in value.items():
+            for line in _gml_lines(k, v, indent + '  '):
+                yield line
+        yield indent + ']'
+    elif isinstance(value, str):
+        yield '{0}{1} "{2}"'.format(indent, key, _gml_escape(value))
+    else:
+        raise ValueError('{0!r} is not a string'.format(value))
+
+
+def _generate_gml(graph, exclude=()):
+    """
+    Generate the lines of the GML representation of a graph.
+
+    The lines are the same as those generated by `networkx.generate_gml` for a copy of the graph
+    with list and set values of attributes converted to strings and excluded attributes removed,
+    but the graph is not copied.
+    """
+    exclude = set(exclude)
+
+    def attributes(data, ignored):
         for k, v in data.items():
-            if isinstance(v, (list, set)):
-                data[k] = '//'.join([str(x) for x in v])
-    with open(path, 'w') as f:
-        for line in nx.generate_gml(ng):
+            if k not in ignored and k not in exclude:
+                for line in _gml_lines(k, v, '    '):
+                    yield line
+
+    multigraph = graph.is_multigraph()
+
+    yield 'graph ['
+    if graph.is_directed():
+        yield '  directed 1'
+    if multigraph:
+        yield '  multigraph 1'
+    for k, v in graph.graph.items():
+        if k not in {'directed', 'multigraph', 'node', 'edge'}:
+            for line in _gml_lines(k, v, '  '):
+                yield line
+
+    node_id = {node: i for i, node in enumerate(graph)}
+    for node, data in graph.nodes(data=True):
+        yield '  node ['
+        yield '    id {0}'.format(node_id[node])
+        for line in _gml_lines('label', node, '    '):
+            yield line
+        for line in attributes(data, {'id', 'label'}):
+            yield line
+        yield '  ]'
+
+    if multigraph:
+        edges = graph.edges(keys=True, data=True)
+    else:
+        edges = ((u, v, None, data) for u, v, data in graph.edges(data=True))
+    ignored = {'source', 'target', 'key'} if multigraph else {'source', 'target'}
+    for u, v, key, data in edges:
+        yield '  edge ['
+        yield '    source {0}'.format(node_id[u])
+        yield '    target {0}'.format(node_id[v])
+        if multigraph:
+            for line in _gml_lines('key', key, '    '):
+                yield line
+        for line in attributes(data, ignored):
+            yield line
+        yield '  ]'
+    yield ']'
+
+
+def write_gml(graph, path, exclude=()):
+    """
+    Write a graph to GML format (using unicode), gzip compressed if `path` ends with ".gz".
+
+    All list and set values in edge and node attributes will be represented in the form of a
+    string with // as separator. The GML is streamed to the file, without copying the graph.
+
+    :param exclude: Names of node and edge attributes which should not be written.
+    """
+    path = pathlib.Path(str(path))
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(str(path), 'wt', encoding='utf8') as f:
+        for line in _generate_gml(graph, exclude=exclude):
             f.write(html.unescape(line) + '\n')
-            
+    return path
+
+
+def read_gml(path):
+    """
+    Read a graph written with `write_gml`.
+    """
+    path = pathlib.Path(str(path))
+    opener = gzip.open if path.suffix == '.gz' else open
+
+    def lines(f):
+        for line in f:
+            yield line.encode('ascii', 'xmlcharrefreplace').decode('utf-8')
+
+    with opener(str(path), 'rt', encoding='utf8') as f:
+        return nx.parse_gml(lines(f))
+
 
 def catalog(name, args):
     repos = getattr(args, name) or Config.from_file().get_clone(name)
@@ -42,18 +174,37 @@ def catalog(name, args):
     return CATALOGS[name](repos, getattr(args, name + '_version'))
 
 
-def networkx2igraph(graph):
-    """Helper function converts networkx graph to igraph graph object."""
-    newgraph = igraph.Graph(directed=graph.is_directed())
-    nodes = {}
-    for i, (node, data) in enumerate(sorted(graph.nodes(data=True), key=lambda i: int(i[0]))):
-        data = {a: b for a, b in data.items()}
-        newgraph.add_vertex(
-            i, Name=node, **{a: b for a, b in data.items() if a not in ['Name', 'name']})
-        nodes[node] = i
-    for node1, node2, data in sorted(graph.edges(data=True), key=lambda i: (int(i[0]), int(i[1]))):
-        newgraph.add_edge(nodes[node1], nodes[node2], **{a: b for a, b in data.items()})
-    return newgraph
+def networkx2igraph(graph, node_attrs=None, edge_attrs=None):
+    """
+    Helper function converts networkx graph to igraph graph object.
+
+    Vertices are ordered by (numeric) node ID, with the vertex index as `name` and the node ID as
+    `Name` attribute. Missing attribute values are `None`.
+
+    :param node_attrs: Names of node attributes to copy - all, if `None`.
+    :param edge_attrs: Names of edge attributes to copy - all, if `None`.
+    """
+    def attr_names(items):
+        return list(collections.OrderedDict((k, None) for data in items for k in data))
+
+    nodes = sorted(graph.nodes(data=True), key=lambda i: int(i[0]))
+    edges = sorted(graph.edges(data=True), key=lambda i: (int(i[0]), int(i[1])))
+    index = {node: i for i, (node, _) in enumerate(nodes)}
+    if node_attrs is None:
+        node_attrs = [a for a in attr_names(d for _, d in nodes) if a not in ['Name', 'name']]
+    if edge_attrs is None:
+        edge_attrs = attr_names(d for _, _, d in edges)
+
+    vertex_attrs = collections.OrderedDict([
+        ('name', list(range(len(nodes)))), ('Name', [node for node, _ in nodes])])
+    for a in node_attrs:
+        vertex_attrs[a] = [data.get(a) for _, data in nodes]
+    return igraph.Graph(
+        n=len(nodes),
+        edges=[(index[u], index[v]) for u, v, _ in edges],
+        directed=graph.is_directed(),
+        vertex_attrs=vertex_attrs,
+        edge_attrs={a: [data.get(a) for _, _, data in edges] for a in edge_attrs})
 
 
 def get_communities(graph, name='infomap'):
@@ -67,7 +218,134 @@ def get_communities(graph, name='infomap'):
     return comms
 
 
-def iter_subgraphs(graph, max_distance=2, max_nodes_pre=30, max_nodes_post=50):
+def bitset_members(bitset):
+    """
+    :param bitset: `int` with bit i set for member i.
+    :return: `list` of the members of the set, in ascending order.
+    """
+    res = []
+    while bitset:
+        low = bitset & -bitset
+        res.append(low.bit_length() - 1)
+        bitset ^= low
+    return res
+
+
+if hasattr(int, 'bit_count'):  # pragma: no cover
+    bitset_size = int.bit_count
+else:  # pragma: no cover
+    def bitset_size(bitset):
+        return bin(bitset).count('1')
+
+
+def graph_fingerprint(graph):
+    """
+    :return: `str` identifying the nodes and edges of a graph, including their order.
+    """
+    md5 = hashlib.md5()
+    md5.update(repr(list(graph.nodes)).encode('utf8'))
+    md5.update(repr(list(graph.edges)).encode('utf8'))
+    return md5.hexdigest()
+
+
+def _neighbors(graph):
+    nodes = list(graph.nodes)
+    index = {n: i for i, n in enumerate(nodes)}
+    return nodes, [[index[m] for m in graph[n]] for n in nodes]
+
+
+def to_bitset(members):
+    """
+    :param members: Iterable of non-negative `int`s.
+    :return: `int` with the bits for the members set.
+    """
+    res = 0
+    for i in members:
+        res |= 1 << i
+    return res
+
+
+def adjacency_bitsets(graph):
+    """
+    :return: Pair (`list` of nodes, `list` of bitsets of the neighbors of each node), with nodes \
+    represented by their index in the list of nodes.
+    """
+    nodes, neighbors = _neighbors(graph)
+    return nodes, [to_bitset(ns) for ns in neighbors]
+
+
+def _ego_network(neighbors, adjacency, node, max_distance, max_nodes_pre, max_nodes_post):
+    members, generation = 1 << node, [node]
+    distance = 0
+    while (  # noqa: W503
+        generation  # There are nodes in the last generation.
+        # Current subgraph is still small:
+        and bitset_size(members) <= max_nodes_pre  # noqa: W503
+        # Maximal node distance not reached yet:
+        and distance < max_distance  # noqa: W503
+    ):
+        # Note: The next generation comprises all neighbors of the last one - including nodes of
+        # earlier generations.
+        nextgen = 0
+        for n in generation:
+            nextgen |= adjacency[n]
+        if bitset_size(nextgen) > max_nodes_post:
+            # Adding another generation would push us over the limit.
+            break
+        members |= nextgen
+        distance += 1
+        if distance < max_distance:
+            generation = neighbors[node] if distance == 1 else bitset_members(nextgen)
+    return members
+
+
+_neighbors_, _adjacency, _params = None, None, None
+
+
+def _init_ego_worker(neighbors, adjacency, params):
+    global _neighbors_, _adjacency, _params
+    _neighbors_, _adjacency, _params = neighbors, adjacency, params
+
+
+def _ego_networks(nodes):
+    return [_ego_network(_neighbors_, _adjacency, n, *_params) for n in nodes]
+
+
+def ego_networks(graph, max_distance=2, max_nodes_pre=30, max_nodes_post=50, workers=1):
+    """
+    Compute the subgraphs of a graph centered on each node, see `iter_subgraphs`.
+
+    Results are cached per process, keyed by the fingerprint of the graph and the parameters.
+
+    :param workers: Number of processes computing ego-networks in parallel.
+    :return: `list` of bitsets of the indices of the nodes in each subgraph, in the order of \
+    `graph.nodes`.
+    """
+    params = (int(max_distance), int(max_nodes_pre), int(max_nodes_post))
+    key = (graph_fingerprint(graph),) + params
+    if key in EGO_NETWORK_CACHE:
+        EGO_NETWORK_CACHE.move_to_end(key)
+        return list(EGO_NETWORK_CACHE[key])
+
+    _, neighbors = _neighbors(graph)
+    adjacency = [to_bitset(ns) for ns in neighbors]
+    if workers > 1 and len(adjacency) > 1:
+        size = max(1, len(adjacency) // (4 * workers))
+        chunks = [range(i, min(i + size, len(adjacency))) for i in range(0, len(adjacency), size)]
+        with multiprocessing.Pool(
+                workers, initializer=_init_ego_worker, initargs=(neighbors, adjacency, params)
+        ) as pool:
+            res = [bitset for chunk in pool.map(_ego_networks, chunks, 1) for bitset in chunk]
+    else:
+        res = [_ego_network(neighbors, adjacency, n, *params) for n in range(len(adjacency))]
+
+    EGO_NETWORK_CACHE[key] = res
+    while len(EGO_NETWORK_CACHE) > EGO_NETWORK_CACHE_SIZE:
+        EGO_NETWORK_CACHE.popitem(last=False)
+    return list(res)
+
+
+def iter_subgraphs(graph, max_distance=2, max_nodes_pre=30, max_nodes_post=50, workers=1):
     """
 
     Parameters
@@ -77,28 +355,29 @@ def iter_subgraphs(graph, max_distance=2, max_nodes_pre=30, max_nodes_post=50):
     max_nodes_pre: The maximal number of nodes in a subgraph before adding another generation of \
     children.
     max_nodes_post: The maximal number of nodes in a subgraph.
+    workers: Number of processes computing subgraphs in parallel.
 
     Returns
     -------
     A generator, yielding (node, subgraph) pairs, where node is the central node of the subgraph
-    specified as list of node IDs.
+    specified as list of node IDs (in the order of `graph.nodes`).
     """
-    for node, data in graph.nodes(data=True):
-        generations = [{node}]
-        while (  # noqa: W503
-            generations[-1]  # There are nodes in the last generation.
-            # Current subgraph is still small:
-            and len(set.union(*generations)) <= max_nodes_pre  # noqa: W503
-           # Maximal node distance not reached yet:
-            and len(generations) <= max_distance  # noqa: W503
-        ):
-            nextgen = set.union(*[set(graph[n].keys()) for n in generations[-1]])
-            if len(nextgen) > max_nodes_post:
-                # Adding another generation would push us over the limit.
-                break  # pragma: no cover
-            else:
-                generations.append(set.union(*[set(graph[n].keys()) for n in generations[-1]]))
-        yield node, list(set.union(*generations))
+    nodes = list(graph.nodes)
+    for node, bitset in zip(nodes, ego_networks(
+            graph,
+            max_distance=max_distance,
+            max_nodes_pre=max_nodes_pre,
+            max_nodes_post=max_nodes_post,
+            workers=workers)):
+        yield node, [nodes[i] for i in bitset_members(bitset)]
+
+
+def implementation_name(obj):
+    """
+    :return: `str` identifying the implementation of a pluggable function, e.g. \
+    "pyclics.plugin:clics_form".
+    """
+    return '{0}:{1}'.format(obj.__module__, getattr(obj, '__name__', type(obj).__name__))
 
 
 def parse_kwargs(*args):
@@ -38,10 +38,23 @@ def test_iter_subgraphs(api, graph, mocker):
     class Network:
         def __init__(self, *args, **kw):
             self.graph = graph
+            self.fname = api.repos / 'missing'
     mocker.patch('pyclics.api.Network', Network)
     assert list(api.iter_subgraphs(None, None, None))
 
 
+def test_load_graph(api, graph, mocker):
+    gml = api.save_graph(graph, 'g', 1, 'f', formats=['gml'])
+    g = api.load_graph('g', 1, 'f')
+    assert gml.with_suffix('.bin').exists()  # A binary snapshot has been written.
+    g.nodes['1']['x'] = 'y'
+    mocker.patch('pyclics.api.Network.graph', mocker.PropertyMock(side_effect=ValueError))
+    assert 'x' not in api.load_graph('g', 1, 'f').nodes['1']
+    api.save_graph(graph, 'g', 1, 'f')
+    with pytest.raises(ValueError):
+        api.load_graph('g', 1, 'f')
+
+
 def test_csv_writer(api):
     with api.csv_writer('test', 'test') as w:
         w.writerows([['a', 'b', 'c'], [1, 2, 3]])
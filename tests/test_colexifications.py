@@ -0,0 +1,126 @@
+import random
+
+import pytest
+import numpy as np
+import networkx as nx
+
+from pyclics.colexifications import (
+    get_transition_matrix, estimate_transition_matrix, weight_by_cognacy, AlignmentCache,
+    PreFilter, bounded_edit_distance,
+)
+
+
+def _dense_transition_matrix(graph, steps, weight='weight'):
+    nodes = [node for node in graph.nodes if len(graph[node]) >= 1]
+    a_matrix = np.zeros((len(nodes), len(nodes)))
+    for node_a, node_b, data in graph.edges(data=True):
+        idx_a, idx_b = nodes.index(node_a), nodes.index(node_b)
+        a_matrix[idx_a, idx_b] = a_matrix[idx_b, idx_a] = data[weight]
+    p_matrix = np.diag(1 / a_matrix.sum(axis=1)) @ a_matrix
+    return sum(np.linalg.matrix_power(p_matrix, i) for i in range(1, steps + 1)), nodes
+
+
+def _graph():
+    rnd = random.Random(1)
+    graph = nx.gnm_random_graph(40, 120, seed=1)
+    graph.add_node(40)  # a singleton
+    graph.add_edge(3, 3)  # a self-loop
+    for _, _, data in graph.edges(data=True):
+        data['weight'] = rnd.randint(1, 5)
+    return graph
+
+
+def test_get_transition_matrix():
+    graph = _graph()
+    expected, nodes = _dense_transition_matrix(graph, 5)
+    p_matrix, nodes_, a_matrix = get_transition_matrix(graph, steps=5, block_size=7)
+    assert nodes_ == nodes and 40 not in nodes
+    assert np.allclose(p_matrix, expected)
+    assert a_matrix[3, 3] == graph[3][3]['weight']
+
+    p_matrix, _, _ = get_transition_matrix(graph, steps=5, normalize=True)
+    assert np.allclose(p_matrix, expected / 5)
+
+
+def test_get_transition_matrix_top_k():
+    graph = _graph()
+    expected, _ = _dense_transition_matrix(graph, 3)
+    p_matrix, _, a_matrix = get_transition_matrix(graph, steps=3, top_k=4, block_size=16)
+    assert a_matrix.nnz == 2 * graph.number_of_edges() - 1
+    for i, row in enumerate(p_matrix):
+        assert row.nnz == 4
+        assert np.allclose(row.data, expected[i, row.indices])
+        assert np.isclose(row.data.min(), np.sort(expected[i])[-4])
+
+
+def test_estimate_transition_matrix():
+    graph = _graph()
+    exact, nodes, _ = get_transition_matrix(graph, steps=4)
+    p_matrix, nodes_, a_matrix, report = estimate_transition_matrix(
+        graph, steps=4, walks=2000, seed=1, block_size=16)
+    assert nodes_ == nodes
+    assert np.allclose(p_matrix.sum(axis=1), 4)
+    error = (p_matrix.toarray() - exact)[p_matrix.toarray() > 0]
+    assert 0.5 < np.sqrt((error ** 2).mean()) / report['rms_error'] < 2
+    assert np.abs(error).max() < 0.1
+    assert report['max_error'] >= report['rms_error']
+
+    p_matrix2, _, _, report2 = estimate_transition_matrix(
+        graph, steps=4, walks=2000, seed=1, block_size=16, workers=2)
+    assert (p_matrix != p_matrix2).nnz == 0 and report == report2
+
+    p_matrix, _, _, report = estimate_transition_matrix(
+        graph, steps=4, walks=2000, seed=1, block_size=16, normalize=True)
+    assert np.allclose(p_matrix.sum(axis=1), 1)
+
+    with pytest.raises(ValueError):
+        estimate_transition_matrix(graph, walks=1)
+
+
+def _cognacy_graph():
+    graph = nx.Graph()
+    graph.add_edge('a', 'b', count=1, words=['m a'], languages=['l1'])
+    graph.add_edge('b', 'c', count=2, words=['ma', 'm a'], languages=['l1', 'l2'])
+    graph.add_edge('c', 'd', count=2, words=['m a', 'k u r u'], languages=['l1', 'l2'])
+    graph.add_edge(
+        'a', 'c', count=3, words=['m a', 'm a n', 't u k'], languages=['l1', 'l2', 'l3'])
+    return graph
+
+
+def test_weight_by_cognacy(tmpdir):
+    graph = _cognacy_graph()
+    cache = AlignmentCache(str(tmpdir.join('cache.sqlite')))
+    weight_by_cognacy(graph, cluster_method='upgma', cache=cache)
+    assert [w for _, _, w in graph.edges(data='cognate_count')] == [1, 2, 1, 2]
+    assert len(cache) == 5 and cache[('m', 'a'), ('m', 'a')] == 0
+
+    # Distances are read from the db, and reused with other settings for the clustering:
+    cache = AlignmentCache(str(tmpdir.join('cache.sqlite')))
+    assert len(cache) == 5
+    graph = _cognacy_graph()
+    weight_by_cognacy(graph, threshold=0.0, cache=cache, workers=2)
+    assert len(cache) == 5
+    assert [w for _, _, w in graph.edges(data='cognate_count')] == [1, 3, 1, 2]
+    assert len(AlignmentCache(str(tmpdir.join('cache.sqlite')), mode='local')) == 0
+
+
+def test_bounded_edit_distance():
+    assert bounded_edit_distance('kitten', 'sitting', 10) == 3
+    assert bounded_edit_distance('kitten', 'sitting', 2) == 2
+    assert bounded_edit_distance('a', 'abcd', 2) == 2
+    assert bounded_edit_distance('', '', 1) == 0
+
+
+def test_weight_by_cognacy_prefilter():
+    prefilter = PreFilter()
+    assert prefilter((('m', 'a'), ('m', 'a'))) == 0
+    # Same sound classes:
+    assert prefilter((('p', 'a'), ('b', 'a'))) == 0
+    assert prefilter((('m', 'a'), ('k', 'u', 'r', 'u'))) == 1
+    assert prefilter((('m', 'a'), ('m', 'a', 'n'))) is None
+
+    graph = _cognacy_graph()
+    report = weight_by_cognacy(graph, cluster_method='upgma', prefilter=prefilter, sample=1)
+    assert [w for _, _, w in graph.edges(data='cognate_count')] == [1, 2, 1, 2]
+    assert report['pairs'] == 5 and report['skipped'] == 0.8
+    assert report['sample'] == 1 and report['disagreements'] == 0
@@ -1,10 +1,18 @@
 import shutil
+import random
+import pathlib
 import logging
 
+import numpy
 import pytest
+import networkx as nx
 
+import pyclics.api
+import pyclics.plugin
 from pyclics.api import Clics
 from pyclics.__main__ import main
+from pyclics.util import iter_subgraphs
+from pyclics.commands.cluster import export_clusters
 
 
 @pytest.fixture
@@ -42,6 +50,14 @@ def test_load(mocker, glottolog, concepticon, dataset, _main, caplog):
             'load', '--unloaded', '--glottolog', glottolog, '--concepticon', concepticon,
             log=logging.getLogger(__name__))
         assert any('skipping' in rec.message for rec in caplog.records)
+        _main(
+            'load', '--glottolog', glottolog, '--concepticon', concepticon,
+            log=logging.getLogger(__name__))
+        assert any('unchanged' in rec.message for rec in caplog.records)
+    _main(
+        'load', '--force', '--workers', '2', '--bulk',
+        '--glottolog', glottolog, '--concepticon', concepticon,
+        log=logging.getLogger(__name__))
     _main('geojson', '--glottolog', glottolog)
 
 
@@ -70,6 +86,69 @@ def test_unknown_cluster_algo(_main):
         _main('cluster', 'abc')
 
 
+def test_dbinfo(api, _main, capsys):
+    _main('dbinfo', '--create-indexes')
+    out, _ = capsys.readouterr()
+    assert 'wordlists' in out and 'clics_form_by_language' in out
+
+
+def test_materialized_colexifications(api, _main):
+    colexifications = list(api.iter_colexifications())
+    assert list(api.iter_colexifications(materialized=True)) == colexifications
+    assert not api.materialize_colexifications()
+    assert api.db.fetchone('select count(*) from colexification')[0] == len(colexifications)
+    _main('colexification', '--materialized')
+
+
+def test_parallel_colexifications(api, _main):
+    colexifications = list(api.iter_colexifications())
+    assert list(api.iter_colexifications(workers=2)) == colexifications
+    assert pyclics.api._api is None
+    _main('colexification', '--workers', '2')
+
+
+def test_colexification_sweep(api, repos, _main):
+    _main('colexification', '--thresholds', '1', '2', '--edgefilters', 'families', 'words')
+    summary = repos.joinpath('graphs', 'network-sweep.tsv').read_text(encoding='utf8')
+    assert len(summary.strip().split('\n')) == 5
+    assert repos.joinpath('graphs', 'network-2-words.gml').exists()
+
+
+def test_incremental_colexification(api, repos, _main):
+    gml = repos.joinpath('graphs', 'network-1-families.gml')
+    _main('colexification')
+    full = gml.read_text(encoding='utf8')
+    _main('colexification', '--incremental')
+    assert gml.read_text(encoding='utf8') == full
+    assert gml.with_suffix('.bin').exists()
+    assert repos.joinpath('graphs', 'partials', 'td.pickle').exists()
+    # Now re-using the partial results:
+    _main('colexification', '--incremental')
+    assert gml.read_text(encoding='utf8') == full
+
+    # Data added from Glottolog changes, without changing the dataset fingerprint:
+    with api.db.connection() as conn:
+        conn.execute("update LanguageTable set family = 'newfamily' where rowid % 3 = 0")
+        conn.commit()
+    _main('colexification', '--incremental')
+    incremental = gml.read_text(encoding='utf8')
+    assert 'newfamily' in incremental
+    _main('colexification')
+    assert gml.read_text(encoding='utf8') == incremental
+
+
+def test_colexification_sidecar(api, repos, _main):
+    _main('colexification', '--sidecar')
+    assert repos.joinpath('graphs', 'network-1-families.sqlite').exists()
+    graph = api.load_graph('network', 1, 'families')
+    assert not any('wofam' in data for _, _, data in graph.edges(data=True))
+    u, v = next(iter(graph.edges))
+    assert 'wofam' in api.graph_attributes('network', 1, 'families').edges([(v, u)])[
+        tuple(sorted([u, v]))]
+    _main('colexification')
+    assert api.graph_attributes('network', 1, 'families') is None
+
+
 def test_workflow(api, mocker, capsys, _main):
     _main('-s', '10', 'colexification')
     out, err = capsys.readouterr()
@@ -105,3 +184,59 @@ def test_workflow(api, mocker, capsys, _main):
     _main('-t', '5', '--edgefilter', 'words', 'graph_stats')
     out, err = capsys.readouterr()
     assert 'edges         69' in out
+
+
+def test_makeapp_parallel(api, repos, _main):
+    _main('-s', '10', 'colexification')
+    _main('makeapp', '--workers', '2', 'subgraph', 'infomap[weight=FamilyWeight]')
+    names = repos.joinpath('app', 'source', 'cluster-names.js').read_text(encoding='utf8')
+    assert '"subgraph"' in names and '"infomap"' in names
+    assert api.load_graph('infomap', 1, 'families')
+    assert list(repos.joinpath('app', 'cluster', 'subgraph').iterdir())
+
+
+def test_makeapp_parallel_seeded(api, repos, mocker, _main):
+    # Randomized cluster algorithms see the same random numbers, no matter whether they are run
+    # sequentially or in parallel:
+    mocker.patch(
+        'pyclics.commands.cluster.cluster_graph',
+        lambda args, graph, **kw: [random.random(), float(numpy.random.random())])
+
+    def clusters(workers):
+        _main('-s', '3', 'makeapp', '--workers', workers, 'subgraph', 'infomap')
+        return repos.joinpath('app', 'source', 'cluster-names.js').read_text(encoding='utf8')
+
+    _main('colexification')
+    assert clusters('1') == clusters('2')
+
+
+def test_makeapp_workers_not_passed_to_clusterer(api, mocker, _main):
+    _main('-s', '10', 'colexification')
+    ego_networks = mocker.spy(pyclics.plugin, 'ego_networks')
+    _main('makeapp', '--workers', '2', 'subgraph')
+    assert ego_networks.call_args[1]['workers'] == 1
+    _main('cluster', 'subgraph', 'workers=2')
+    assert ego_networks.call_args[1]['workers'] == 2
+
+
+def test_export_clusters_overlapping(tmpdir):
+    # Subgraph clusters overlap, thus nodes are annotated with OutEdges more than once:
+    rnd = random.Random(1)
+    graph = nx.gnm_random_graph(200, 800, seed=1)
+    graph = nx.relabel_nodes(graph, {n: str(n + 1) for n in graph})
+    for n, data in graph.nodes(data=True):
+        data.update(Gloss='G' + n, ClusterName='c' + n, CentralConcept='G' + n)
+    for _, _, data in graph.edges(data=True):
+        data.update(FamilyWeight=rnd.randint(1, 10), WordWeight=rnd.randint(1, 20))
+    clusters = {i: sg for i, (_, sg) in enumerate(iter_subgraphs(graph), start=1)}
+
+    def export(name, serial):
+        d = pathlib.Path(str(tmpdir.mkdir(name)))
+        if serial:  # One cluster at a time, waiting for the JSON to be written.
+            for idx, nodes in clusters.items():
+                export_clusters(graph, {idx: nodes}, 'subgraph', 5, d)
+        else:
+            export_clusters(graph, clusters, 'subgraph', 5, d)
+        return {p.name: p.read_text(encoding='utf8') for p in d.iterdir()}
+
+    assert export('serial', True) == export('parallel', False)
@@ -31,3 +31,67 @@ def test_db_queries(db):
             break
     concepts = list(db.iter_concepts())
     assert len(concepts) == 499
+
+
+def test_iter_wordlists_streaming(db):
+    varieties = db.varieties
+    streamed = list(db.iter_wordlists(varieties))
+    assert streamed == list(db.iter_wordlists(varieties, streaming=False))
+    assert [v for v, _ in streamed] == sorted(varieties, key=lambda v: (v.source, v.id))
+
+    assert len(list(db.iter_wordlists(varieties[:2]))) == 2
+
+
+def test_read_write(db, dataset, tmp_path):
+    from pyclics.db import Database, dataset_spec
+    from pyclics.plugin import clics_form
+
+    spec = dataset_spec(dataset, clics_form)
+    data = db.read(*spec)
+    assert data.id == 'td' and data.fingerprint == spec[-1]
+    forms = [t for t in data.tables if t.name == 'FormTable'][0]
+    assert '`clics_form`' in forms.keys
+    i, j = forms.keys.index('`Form`'), forms.keys.index('`clics_form`')
+    assert all(row[j] == clics_form(row[i]) for row in forms.rows)
+
+    # IClicsForm implementations without batch support are called per form:
+    data = Database(db.fname, lambda w: w.upper()).read(*spec)
+    forms = [t for t in data.tables if t.name == 'FormTable'][0]
+    assert all(row[j] == row[i].upper() for row in forms.rows)
+
+    db2 = Database(tmp_path / 'db.sqlite', clics_form)
+    db2.create()
+    assert list(db2.load_datasets([spec, spec], workers=2)) == ['td', 'td']
+    assert db2.fingerprints == {'td': spec[-1]}
+    assert db2.fetchone('select count(*) from formtable')[0] == \
+        db.fetchone('select count(*) from formtable')[0]
+
+
+def test_bulk_load(db, dataset, tmp_path):
+    from pyclics.db import Database
+    from pyclics.plugin import clics_form
+
+    db2 = Database(tmp_path / 'db.sqlite', clics_form)
+    db2.create()
+    with db2.bulk_load():
+        db2.load(dataset)
+        assert db2.fetchone('PRAGMA journal_mode')[0] == 'wal'
+        assert not db2.fetchall("select name from sqlite_master where name like 'clics_%'")
+    assert db2.fetchone('PRAGMA journal_mode')[0] == 'delete'
+    assert db2.fetchall("select name from sqlite_master where name like 'clics_%'")
+    assert db2.purge(['td']) == (0, 1)
+
+
+def test_catalog_digests(db, tmp_path):
+    import shutil
+    from pyclics.db import Database
+    from pyclics.plugin import clics_form
+
+    shutil.copy(str(db.fname), str(tmp_path / 'db.sqlite'))
+    db2 = Database(tmp_path / 'db.sqlite', clics_form)
+    digest = db2.catalog_digests['td']
+    assert db2.catalog_digests == db.catalog_digests
+    with db2.connection() as conn:
+        conn.execute("update LanguageTable set macroarea = 'x' where rowid = 1")
+        conn.commit()
+    assert db2.catalog_digests['td'] != digest
@@ -0,0 +1,64 @@
+from networkx import Graph
+
+from pyclics.models import Form, Variety
+from pyclics.edges import EdgeAccumulator, passes_filter
+
+
+def _colexification(lid, family, fid, form, concepts):
+    v = Variety(lid, 'ds', lid, None, family, None, None, None)
+    return tuple([v] + [
+        Form('{0}{1}'.format(fid, i), 'ds', form, form, None, c, None, None, None)
+        for i, c in enumerate(concepts)])
+
+
+def test_passes_filter():
+    assert passes_filter((1, 2, 3), 2, 'languages')
+    assert not passes_filter((1, 2, 3), 2, 'families')
+    assert passes_filter((1, 2, 3), 5, 'none')
+
+
+def test_EdgeAccumulator():
+    edges = EdgeAccumulator().update([
+        _colexification('l1', 'f1', 'a', 'x/y', ['1', '2']),
+        _colexification('l2', 'f1', 'b', 'z', ['2', '1']),
+        _colexification('l1', 'f1', 'c', 'u', ['2', '3']),
+    ])
+    assert len(edges) == 2
+    assert [(a, b, e.weights) for a, b, e in edges.iter_edges()] == \
+        [('1', '2', (1, 2, 2)), ('2', '3', (1, 1, 1))]
+    assert [(a, b) for a, b, _ in edges.iter_edges(nodes=['3', '2', '1'])] == \
+        [('3', '2'), ('2', '1')]
+    _, _, edge = next(edges.iter_edges())
+    assert edges.languages(edge) == {'ds-l1', 'ds-l2'}
+    attrs = edges.edge_attrs(edge)
+    assert attrs['words'] == 'ds-a0/ds-a1;ds-b0/ds-b1'
+    assert attrs['wofam'].split(';')[0] == 'ds-a0/ds-a1/x/y/ds-l1/f1/xy/xy'
+
+    graph = Graph()
+    assert edges.add_to_graph(graph, 2, 'languages') == 1
+    assert list(graph.edges(data='LanguageWeight')) == [('1', '2', 2)]
+
+
+def test_EdgeAccumulator_language_stats():
+    edges = EdgeAccumulator().update([
+        _colexification('l1', 'f1', 'a', 'x', ['1', '2']),
+        _colexification('l2', 'f2', 'b', 'z', ['1', '2']),
+        _colexification('l1', 'f1', 'c', 'u', ['2', '3']),
+    ])
+    stats = edges.language_stats(
+        {'ds-l1': {'1', '2'}, 'ds-l2': {'1', '2', '3'}, 'ds-l3': set()}, 2, 'languages')
+    # l1 colexifies 2-3 without a form for 3 in its inventory.
+    assert stats == {'ds-l1': (2, 2, 1, 1), 'ds-l2': (1, 2, 1, 1), 'ds-l3': (0, 0, 0, 0)}
+
+
+def test_EdgeAccumulator_merge():
+    colexifications = [
+        _colexification('l1', 'f1', 'a', 'x', ['1', '2']),
+        _colexification('l2', 'f2', 'b', 'z', ['3', '1']),
+        _colexification('l3', 'f1', 'c', 'u', ['2', '1']),
+    ]
+    edges = EdgeAccumulator().update(colexifications)
+    merged = EdgeAccumulator().update(colexifications[:1])
+    merged.merge(EdgeAccumulator().update(colexifications[1:]))
+    assert [(a, b, edges.edge_attrs(e)) for a, b, e in edges.iter_edges()] == \
+        [(a, b, merged.edge_attrs(e)) for a, b, e in merged.iter_edges()]
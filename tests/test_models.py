@@ -1,6 +1,6 @@
 import networkx
 
-from pyclics.models import *
+from pyclics.models import Variety, Concept, Network
 from pyclics.util import get_communities
 
 
@@ -34,3 +34,26 @@ def test_Network(tmpdir):
     assert p.exists()
     assert sorted(networkx.connected_components(n.graph)) == [{'n1', 'n2'}]
     assert get_communities(n.graph)['x'] == ['n1']
+
+
+def test_Network_bin(tmpdir):
+    g = _make_graph()
+    g.add_edge('n2', 'n3', weight=1.5, words='a;b')
+    n = Network('g', 't', 'e', str(tmpdir), format='bin')
+    assert n.save(g).name == 'g-t-e.bin'
+    graph = n.graph
+    assert list(graph.nodes(data=True)) == list(g.nodes(data=True))
+    assert list(graph.edges(data=True)) == list(g.edges(data=True))
+
+
+def test_Network_bin_mixed_types(tmpdir):
+    g = _make_graph()
+    g.nodes['n1']['mixed'] = 1
+    g.nodes['n2']['mixed'] = 'a'
+    g.add_edge('n2', 'n3', big=2 ** 70, mixed=1.5)
+    g.add_edge('n1', 'n3', big=1, mixed=True)
+    n = Network('g', 't', 'e', str(tmpdir), format='bin')
+    n.save(g)
+    graph = n.graph
+    assert list(graph.nodes(data=True)) == list(g.nodes(data=True))
+    assert list(graph.edges(data=True)) == list(g.edges(data=True))
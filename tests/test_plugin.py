@@ -7,3 +7,11 @@ def test_colexification():
     formB = Form('', '', 'yz', 'abcd', '', '2', '', '', '')
     res = list(full_colexification([formA, formB]))
     assert len(res[0]) == 2
+
+
+def test_ClicsForm():
+    from pyclics.plugin import clics_form
+
+    assert clics_form('') is None
+    assert clics_form('Bə-ábc') == 'b@abc'
+    assert clics_form.batch(['Bə', None, 'a\x00b', 'äöü']) == ['b@', None, 'ab', 'aou']
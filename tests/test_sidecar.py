@@ -0,0 +1,25 @@
+from networkx import Graph
+from networkx.readwrite import json_graph
+
+from pyclics.sidecar import AttributeStore
+
+
+def test_AttributeStore(tmpdir):
+    g = Graph()
+    g.add_node('1', Words='a;b', Gloss='x')
+    g.add_node('2', Words='c')
+    g.add_edge('2', '1', wofam='a/c', FamilyWeight=1)
+    store = AttributeStore(str(tmpdir.join('g.sqlite')))
+    assert not store.exists()
+    store.write(g)
+    assert store.nodes(['1', '3']) == {'1': {'Words': 'a;b'}}
+    assert store.edges([('2', '1')]) == {('1', '2'): {'wofam': 'a/c'}}
+
+    copy = AttributeStore(str(tmpdir.join('copy.sqlite')))
+    copy.write(g.subgraph(['1']), source=store)
+    assert copy.nodes(['1', '2']) == {'1': {'Words': 'a;b'}}
+
+    data = json_graph.adjacency_data(Graph([('1', '2')]))
+    store.enrich_adjacency_data(data)
+    assert data['nodes'][0]['Words'] == 'a;b'
+    assert data['adjacency'][0][0]['wofam'] == 'a/c'
@@ -1,7 +1,80 @@
+import html
+import collections
+
+import networkx as nx
 from networkx import Graph
 
-from pyclics.util import iter_subgraphs
+from pyclics.util import iter_subgraphs, write_gml, read_gml, networkx2igraph
 
 
 def test_iter_subgraphs(graph):
     assert len(list(iter_subgraphs(graph))) == 2
+
+
+def test_write_gml(tmpdir, graph):
+    graph.nodes[1]['OutEdge'] = [['a', 1], 'b']
+    for name in ['g.gml', 'g.gml.gz']:
+        p = write_gml(graph, str(tmpdir.join(name)))
+        g = read_gml(p)
+        assert g.nodes['1']['OutEdge'] == "['a', 1]//b"
+        assert list(g.edges) == [('1', '2')]
+    assert isinstance(graph.nodes[1]['OutEdge'], list)
+
+
+def test_write_gml_format(tmpdir):
+    graph = Graph(name='g')
+    graph.add_node('1', Gloss='Bäume & "Wald"', Weight=2.5, Flag=True, Big=2 ** 40)
+    graph.add_node('2', Gloss='x\ty', Weight=1e20, Words=['a', 'b'])
+    graph.add_edge('1', '2', FamilyWeight=3, wofam={'a', 'a'}, Weight=float('inf'), skip='x')
+
+    # The output is the same as the one written by networkx for a copy of the graph:
+    copy = graph.copy()
+    for data in [d for _, d in copy.nodes(data=True)] + [d for _, _, d in copy.edges(data=True)]:
+        data.pop('skip', None)
+        for k, v in data.items():
+            if isinstance(v, (list, set)):
+                data[k] = '//'.join([str(x) for x in v])
+    expected = ''.join(html.unescape(line) + '\n' for line in nx.generate_gml(copy))
+    p = write_gml(graph, str(tmpdir.join('g.gml')), exclude=['skip'])
+    assert p.read_text(encoding='utf8') == expected
+
+
+def test_networkx2igraph(graph):
+    graph.add_node(3, Gloss='x', Name='y')
+    graph.add_edge(3, 1, weight=2)
+    g = networkx2igraph(graph)
+    assert g.vs['name'] == [0, 1, 2]
+    assert g.vs['Name'] == [1, 2, 3]
+    assert g.vs['Gloss'] == [None, None, 'x']
+    assert g.get_edgelist() == [(0, 1), (0, 2)]
+    assert g.es['weight'] == [None, 2]
+
+    g = networkx2igraph(graph, node_attrs=[], edge_attrs=['weight'])
+    assert g.vs.attributes() == ['name', 'Name']
+
+
+def test_ego_networks(monkeypatch):
+    from pyclics import util
+
+    # We tamper with cached results below, so we use a cache private to this test:
+    monkeypatch.setattr(util, 'EGO_NETWORK_CACHE', collections.OrderedDict())
+    graph = Graph()
+    graph.add_edges_from([('a', 'b'), ('b', 'c'), ('c', 'd'), ('d', 'e'), ('x', 'x')])
+    assert dict(iter_subgraphs(graph)) == {
+        'a': ['a', 'b', 'c'],
+        'b': ['a', 'b', 'c', 'd'],
+        'c': ['a', 'b', 'c', 'd', 'e'],
+        'd': ['b', 'c', 'd', 'e'],
+        'e': ['c', 'd', 'e'],
+        'x': ['x']}
+    assert dict(iter_subgraphs(graph, max_distance=1))['c'] == ['b', 'c', 'd']
+    # The second generation would push the subgraph over the limit:
+    assert dict(iter_subgraphs(graph, max_nodes_post=2))['c'] == ['b', 'c', 'd']
+    assert util.bitset_members(util.to_bitset([5, 0, 2])) == [0, 2, 5]
+
+    key = (util.graph_fingerprint(graph), 2, 30, 50)
+    assert key in util.EGO_NETWORK_CACHE
+    util.EGO_NETWORK_CACHE[key][0] = 0
+    assert dict(iter_subgraphs(graph))['a'] == []
+    graph.add_edge('a', 'e')
+    assert dict(iter_subgraphs(graph, workers=2))['a'] == ['a', 'b', 'c', 'd', 'e']